@@ -0,0 +1,8 @@
+from .fakees import FakeElasticsearch  # noqa
+from .runner import (  # noqa
+    BENCHMARKS,
+    benchmark,
+    benchmark_variants,
+    compare,
+    run_benchmarks,
+)
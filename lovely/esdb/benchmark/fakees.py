@@ -0,0 +1,642 @@
+import copy
+import itertools
+import threading
+import time
+import zlib
+
+from elasticsearch.exceptions import NotFoundError, ConflictError
+from elasticsearch.serializer import JSONSerializer
+
+from ..document.incremental import UPDATE_SCRIPT, apply_update
+
+
+# python implementations of the scripts used by lovely.esdb, registered by
+# the script source
+SCRIPTS = {}
+
+
+def register_script(source, func):
+    """Register a python implementation for a script
+
+    `func` is called with the `_source` of the document and the script params
+    and must modify the source in place.
+    """
+    SCRIPTS[source] = func
+
+
+register_script(UPDATE_SCRIPT, apply_update)
+
+
+class FakeTransport(object):
+
+    def __init__(self, serializer):
+        self.serializer = serializer
+
+
+class FakeIndicesClient(object):
+
+    def __init__(self, client):
+        self.client = client
+
+    def create(self, index, body=None, **kwargs):
+        if index in self.client.data:
+            raise self.client._error(400, 'index_already_exists_exception',
+                                     index)
+        body = body or {}
+        self.client.data[index] = {}
+        self.client.settings[index] = body.get('settings', {})
+        self.client.mappings[index] = copy.deepcopy(body.get('mappings', {}))
+        return {u'acknowledged': True}
+
+    def exists(self, index, **kwargs):
+        return index in self.client.data or index in self.client.aliases
+
+    def delete(self, index, **kwargs):
+        for name in self.client._resolve(index):
+            del self.client.data[name]
+            self.client.mappings.pop(name, None)
+        return {u'acknowledged': True}
+
+    def refresh(self, index=None, **kwargs):
+        return {u'_shards': {u'failed': 0}}
+
+    def put_mapping(self, doc_type, body, index=None, **kwargs):
+        for name in self.client._resolve(index):
+            mappings = self.client.mappings.setdefault(name, {})
+            mapping = mappings.setdefault(doc_type, {})
+            merge(mapping, copy.deepcopy(body))
+        return {u'acknowledged': True}
+
+    def get_mapping(self, index=None, doc_type=None, **kwargs):
+        res = {}
+        for name in self.client._resolve(index):
+            mappings = self.client.mappings.get(name, {})
+            if doc_type is not None:
+                mappings = dict((k, v) for k, v in mappings.items()
+                                if k == doc_type)
+            res[name] = {u'mappings': copy.deepcopy(mappings)}
+        return res
+
+    def exists_alias(self, index=None, name=None, **kwargs):
+        return name in self.client.aliases
+
+    def get_alias(self, index=None, name=None, **kwargs):
+        res = {}
+        for alias, indexes in self.client.aliases.items():
+            if name is not None and alias != name:
+                continue
+            for idx in indexes:
+                res.setdefault(idx, {u'aliases': {}})[u'aliases'][alias] = {}
+        if name is not None and not res:
+            raise self.client._error(404, 'aliases_not_found_exception', name)
+        return res
+
+    def update_aliases(self, body, **kwargs):
+        aliases = copy.deepcopy(self.client.aliases)
+        removed = []
+        for action in body['actions']:
+            (op, spec), = action.items()
+            if op == 'add':
+                if spec['index'] not in self.client.data:
+                    raise self.client._error(404, 'index_not_found_exception',
+                                             spec['index'])
+                aliases.setdefault(spec['alias'], set()).add(spec['index'])
+            elif op == 'remove':
+                aliases.get(spec['alias'], set()).discard(spec['index'])
+                if not aliases.get(spec['alias']):
+                    aliases.pop(spec['alias'], None)
+            elif op == 'remove_index':
+                if spec['index'] not in self.client.data:
+                    raise self.client._error(404, 'index_not_found_exception',
+                                             spec['index'])
+                removed.append(spec['index'])
+        for name in removed:
+            del self.client.data[name]
+            self.client.mappings.pop(name, None)
+        self.client.aliases = aliases
+        return {u'acknowledged': True}
+
+
+class FakeTasksClient(object):
+
+    def __init__(self, client):
+        self.client = client
+
+    def get(self, task_id, **kwargs):
+        if task_id not in self.client.tasks_data:
+            raise self.client._error(404, 'resource_not_found_exception',
+                                     task_id)
+        return copy.deepcopy(self.client.tasks_data[task_id])
+
+
+class FakeElasticsearch(object):
+    """An in-process stand-in for the elasticsearch client
+
+    Implements the subset of the `elasticsearch.Elasticsearch` API which is
+    used by lovely.esdb. The documents are kept in memory which makes it
+    possible to run benchmarks and tests without a running cluster.
+
+    `latency` is the number of seconds each request sleeps to simulate the
+    network round-trip.
+    """
+
+    def __init__(self, latency=0, serializer=None):
+        self.latency = latency
+        self.transport = FakeTransport(serializer or JSONSerializer())
+        self.indices = FakeIndicesClient(self)
+        self.tasks = FakeTasksClient(self)
+        self.data = {}
+        self.settings = {}
+        self.mappings = {}
+        self.aliases = {}
+        self.scrolls = {}
+        self.tasks_data = {}
+        self.requests = []
+        self._lock = threading.RLock()
+        self._ids = itertools.count(1)
+
+    def index(self, index, doc_type, body, id=None, **kwargs):
+        with self._request('index'):
+            body = self._loads(body)
+            name = self._write_index(index)
+            docs = self.data[name].setdefault(doc_type, {})
+            if id is None:
+                id = unicode(next(self._ids))
+            id = unicode(id)
+            current = docs.get(id)
+            if current is not None and kwargs.get('op_type') == 'create':
+                raise self._error(409, 'document_already_exists_exception',
+                                  id)
+            version = self._next_version(current, id, **kwargs)
+            docs[id] = {'_source': body, '_version': version}
+            return self._write_response(name, doc_type, id, version,
+                                        created=current is None)
+
+    def create(self, index, doc_type, body, id=None, **kwargs):
+        kwargs['op_type'] = 'create'
+        return self.index(index, doc_type, body, id=id, **kwargs)
+
+    def get(self, index, id, doc_type='_all', **kwargs):
+        with self._request('get'):
+            hit = self._get(index, doc_type, unicode(id))
+            if hit is None:
+                raise self._error(404, 'document_missing', id)
+            return hit
+
+    def exists(self, index, doc_type, id, **kwargs):
+        with self._request('exists'):
+            return self._get(index, doc_type, unicode(id)) is not None
+
+    def mget(self, body, index=None, doc_type=None, **kwargs):
+        with self._request('mget'):
+            body = self._loads(body)
+            if 'ids' in body:
+                specs = [{'_id': id} for id in body['ids']]
+            else:
+                specs = body['docs']
+            docs = []
+            for spec in specs:
+                idx = spec.get('_index', index)
+                typ = spec.get('_type', doc_type)
+                id = unicode(spec['_id'])
+                hit = self._get(idx, typ, id)
+                if hit is None:
+                    hit = {u'_index': idx, u'_type': typ, u'_id': id,
+                           u'found': False}
+                docs.append(hit)
+            return {u'docs': docs}
+
+    def update(self, index, doc_type, id, body=None, **kwargs):
+        with self._request('update'):
+            body = self._loads(body)
+            name = self._write_index(index)
+            docs = self.data[name].setdefault(doc_type, {})
+            id = unicode(id)
+            current = docs.get(id)
+            if current is None:
+                if 'upsert' in body:
+                    source = copy.deepcopy(body['upsert'])
+                elif body.get('doc_as_upsert'):
+                    source = copy.deepcopy(body['doc'])
+                else:
+                    raise self._error(404, 'document_missing_exception', id)
+            else:
+                source = copy.deepcopy(current['_source'])
+                if 'doc' in body:
+                    merge(source, copy.deepcopy(body['doc']))
+                if 'script' in body:
+                    self._run_script(source, body['script'])
+            version = self._next_version(current, id, **kwargs)
+            docs[id] = {'_source': source, '_version': version}
+            return self._write_response(name, doc_type, id, version,
+                                        created=current is None)
+
+    def delete(self, index, doc_type, id, **kwargs):
+        with self._request('delete'):
+            id = unicode(id)
+            for name in self._resolve(index):
+                docs = self.data[name].get(doc_type, {})
+                if id in docs:
+                    current = docs[id]
+                    version = self._next_version(current, id, **kwargs)
+                    del docs[id]
+                    return {u'_index': name, u'_type': doc_type, u'_id': id,
+                            u'_version': version, u'found': True}
+            raise self._error(404, 'not_found', id)
+
+    def search(self, index=None, doc_type=None, body=None, scroll=None,
+               size=None, from_=None, search_type=None, **kwargs):
+        with self._request('search'):
+            started = time.time()
+            body = self._loads(body) or {}
+            hits = self._query(index, doc_type, body)
+            total = len(hits)
+            if size is None:
+                size = body.get('size', 10)
+            if scroll is not None:
+                scroll_id = unicode(next(self._ids))
+                self.scrolls[scroll_id] = {'hits': hits, 'size': size}
+                page = []
+                if search_type != 'scan':
+                    page = self._next_scroll_page(scroll_id)
+                res = self._search_response(page, total, started)
+                res[u'_scroll_id'] = scroll_id
+                return res
+            offset = from_ if from_ is not None else body.get('from', 0)
+            page = hits[offset:offset + size]
+            return self._search_response(page, total, started)
+
+    def scroll(self, scroll_id=None, body=None, scroll=None, **kwargs):
+        with self._request('scroll'):
+            if scroll_id is None:
+                scroll_id = self._loads(body)['scroll_id']
+            if scroll_id not in self.scrolls:
+                raise self._error(404, 'search_context_missing_exception',
+                                  scroll_id)
+            started = time.time()
+            total = len(self.scrolls[scroll_id]['hits'])
+            page = self._next_scroll_page(scroll_id)
+            res = self._search_response(page, total, started)
+            res[u'_scroll_id'] = scroll_id
+            return res
+
+    def clear_scroll(self, scroll_id=None, body=None, **kwargs):
+        with self._request('clear_scroll'):
+            if scroll_id is None:
+                scroll_id = self._loads(body)['scroll_id']
+            if not isinstance(scroll_id, list):
+                scroll_id = [scroll_id]
+            for sid in scroll_id:
+                self.scrolls.pop(sid, None)
+            return {u'succeeded': True}
+
+    def count(self, index=None, doc_type=None, body=None, **kwargs):
+        with self._request('count'):
+            body = self._loads(body) or {}
+            return {u'count': len(self._query(index, doc_type, body)),
+                    u'_shards': {u'total': 1, u'successful': 1,
+                                 u'failed': 0}}
+
+    def update_by_query(self, index, doc_type=None, body=None, **kwargs):
+        with self._request('update_by_query'):
+            body = self._loads(body) or {}
+            started = time.time()
+            updated = 0
+            for hit in self._query(index, doc_type, body):
+                stored = self.data[hit['_index']][hit['_type']][hit['_id']]
+                if 'script' in body:
+                    self._run_script(stored['_source'], body['script'])
+                stored['_version'] += 1
+                updated += 1
+            return self._by_query_response(updated, 'updated', started,
+                                           **kwargs)
+
+    def delete_by_query(self, index, doc_type=None, body=None, **kwargs):
+        with self._request('delete_by_query'):
+            body = self._loads(body) or {}
+            started = time.time()
+            deleted = 0
+            for hit in self._query(index, doc_type, body):
+                del self.data[hit['_index']][hit['_type']][hit['_id']]
+                deleted += 1
+            return self._by_query_response(deleted, 'deleted', started,
+                                           **kwargs)
+
+    def bulk(self, body, index=None, doc_type=None, **kwargs):
+        with self._request('bulk'):
+            started = time.time()
+            if not isinstance(body, (list, tuple)):
+                body = [line for line in body.split('\n') if line.strip()]
+            lines = iter(body)
+            items = []
+            errors = False
+            for line in lines:
+                action = self._loads(line)
+                (op_type, meta), = action.items()
+                data = None
+                if op_type != 'delete':
+                    data = self._loads(next(lines))
+                item = self._bulk_item(op_type, meta, data, index, doc_type)
+                if item.get('status', 200) >= 300:
+                    errors = True
+                items.append({op_type: item})
+            return {u'took': int((time.time() - started) * 1000),
+                    u'errors': errors,
+                    u'items': items}
+
+    def _bulk_item(self, op_type, meta, data, index, doc_type):
+        idx = meta.get('_index', index)
+        typ = meta.get('_type', doc_type)
+        id = meta.get('_id')
+        kwargs = {}
+        if '_version' in meta:
+            kwargs['version'] = meta['_version']
+        if '_version_type' in meta:
+            kwargs['version_type'] = meta['_version_type']
+        try:
+            # the lock is reentrant, the single operations can be reused
+            if op_type in ('index', 'create'):
+                if op_type == 'create':
+                    kwargs['op_type'] = 'create'
+                res = self.index(idx, typ, data, id=id, **kwargs)
+                status = res[u'created'] and 201 or 200
+            elif op_type == 'update':
+                res = self.update(idx, typ, id, data, **kwargs)
+                status = 200
+            elif op_type == 'delete':
+                res = self.delete(idx, typ, id, **kwargs)
+                status = 200
+            else:
+                raise self._error(400, 'illegal_argument_exception', op_type)
+        except (NotFoundError, ConflictError) as e:
+            return {u'_index': idx, u'_type': typ, u'_id': id,
+                    u'status': e.status_code, u'error': e.info}
+        res[u'status'] = status
+        return res
+
+    def _request(self, operation):
+        self.requests.append(operation)
+        if self.latency:
+            time.sleep(self.latency)
+        return self._lock
+
+    def _loads(self, body):
+        """Provide the data of a request body like elasticsearch sees it
+        """
+        if body is None:
+            return None
+        serializer = self.transport.serializer
+        if not isinstance(body, basestring):
+            body = serializer.dumps(body)
+        return serializer.loads(body)
+
+    def _error(self, status, error, info):
+        cls = {404: NotFoundError, 409: ConflictError}.get(status)
+        if cls is None:
+            from elasticsearch.exceptions import RequestError
+            cls = RequestError
+        reason = u'%s' % info
+        return cls(status, error, {
+            u'error': {u'root_cause': [{u'type': error, u'reason': reason}],
+                       u'type': error,
+                       u'reason': reason},
+            u'status': status})
+
+    def _resolve(self, index):
+        """Provide the names of the concrete indexes for `index`
+        """
+        if index is None or index in ('_all', '*'):
+            return sorted(self.data.keys())
+        names = []
+        for name in index.split(','):
+            if name in self.aliases:
+                names.extend(sorted(self.aliases[name]))
+            elif name in self.data:
+                names.append(name)
+            else:
+                raise self._error(404, 'index_not_found_exception', name)
+        return names
+
+    def _write_index(self, index):
+        if index in self.aliases:
+            names = self.aliases[index]
+            if len(names) != 1:
+                raise self._error(400, 'illegal_argument_exception', index)
+            index, = names
+        # indexes are created on demand like elasticsearch does it
+        self.data.setdefault(index, {})
+        return index
+
+    def _next_version(self, current, id, version=None, version_type=None,
+                      **kwargs):
+        current_version = current and current['_version'] or 0
+        if version_type in ('external', 'external_gt', 'external_gte'):
+            if current is not None and (version < current_version or
+                                        (version == current_version and
+                                         version_type != 'external_gte')):
+                raise self._error(409, 'version_conflict_engine_exception',
+                                  id)
+            return version
+        if version is not None and version != current_version:
+            raise self._error(409, 'version_conflict_engine_exception', id)
+        return current_version + 1
+
+    def _write_response(self, index, doc_type, id, version, created):
+        return {u'_index': index,
+                u'_type': doc_type,
+                u'_id': id,
+                u'_version': version,
+                u'created': created}
+
+    def _get(self, index, doc_type, id):
+        try:
+            names = self._resolve(index)
+        except NotFoundError:
+            return None
+        for name in names:
+            for typ, docs in self.data[name].items():
+                if doc_type not in (None, '_all', typ):
+                    continue
+                if id in docs:
+                    stored = docs[id]
+                    return {u'_index': name,
+                            u'_type': typ,
+                            u'_id': id,
+                            u'_version': stored['_version'],
+                            u'found': True,
+                            u'_source': copy.deepcopy(stored['_source'])}
+        return None
+
+    def _query(self, index, doc_type, body):
+        query = body.get('query', {'match_all': {}})
+        slice_ = body.get('slice')
+        hits = []
+        for name in self._resolve(index):
+            for typ, docs in sorted(self.data[name].items()):
+                if doc_type not in (None, '_all', typ):
+                    continue
+                for id, stored in sorted(docs.items()):
+                    if slice_ is not None:
+                        if (zlib.crc32(id.encode('utf-8')) % slice_['max']
+                                != slice_['id']):
+                            continue
+                    if not matches(query, id, stored['_source']):
+                        continue
+                    hits.append({u'_index': name,
+                                 u'_type': typ,
+                                 u'_id': id,
+                                 u'_version': stored['_version'],
+                                 u'_score': 1.0,
+                                 u'_source': stored['_source']})
+        for spec in reversed(body.get('sort', [])):
+            if isinstance(spec, basestring):
+                field, order = spec, 'asc'
+            else:
+                (field, order), = spec.items()
+                if isinstance(order, dict):
+                    order = order.get('order', 'asc')
+            if field == '_doc':
+                continue
+            hits.sort(key=lambda hit: sort_key(hit, field),
+                      reverse=order == 'desc')
+        return [copy.deepcopy(hit) for hit in hits]
+
+    def _next_scroll_page(self, scroll_id):
+        context = self.scrolls[scroll_id]
+        page = context['hits'][:context['size']]
+        context['hits'] = context['hits'][context['size']:]
+        return page
+
+    def _search_response(self, hits, total, started):
+        return {u'took': int((time.time() - started) * 1000),
+                u'timed_out': False,
+                u'_shards': {u'total': 1, u'successful': 1, u'failed': 0},
+                u'hits': {u'total': total,
+                          u'max_score': hits and 1.0 or None,
+                          u'hits': hits}}
+
+    def _by_query_response(self, count, key, started,
+                           wait_for_completion=True, **kwargs):
+        res = {u'took': int((time.time() - started) * 1000),
+               u'timed_out': False,
+               u'total': count,
+               key: count,
+               u'batches': count and 1 or 0,
+               u'version_conflicts': 0,
+               u'noops': 0,
+               u'failures': []}
+        if wait_for_completion in (False, 'false'):
+            task_id = u'fake:%s' % next(self._ids)
+            self.tasks_data[task_id] = {u'completed': True,
+                                        u'task': {u'status': res},
+                                        u'response': res}
+            return {u'task': task_id}
+        return res
+
+    def _run_script(self, source, script):
+        if isinstance(script, basestring):
+            script = {'inline': script}
+        code = script.get('inline', script.get('source'))
+        if code not in SCRIPTS:
+            raise self._error(400, 'script_exception', code)
+        SCRIPTS[code](source, script.get('params', {}))
+
+
+def merge(target, data):
+    """Recursively merge `data` into `target` like a partial document update
+    """
+    for k, v in data.items():
+        if isinstance(v, dict) and isinstance(target.get(k), dict):
+            merge(target[k], v)
+        else:
+            target[k] = v
+    return target
+
+
+def lookup(source, path):
+    """Provide the values found at the dotted `path` in `source`
+    """
+    values = [source]
+    for part in path.split('.'):
+        found = []
+        for value in values:
+            if isinstance(value, dict) and part in value:
+                value = value[part]
+                if isinstance(value, list):
+                    found.extend(value)
+                else:
+                    found.append(value)
+            elif isinstance(value, list):
+                for item in value:
+                    if isinstance(item, dict) and part in item:
+                        found.append(item[part])
+        values = found
+    return [v for v in values if v is not None]
+
+
+def sort_key(hit, field):
+    values = lookup(hit['_source'], field)
+    # documents without a value are sorted last
+    return (not values, values and min(values) or None)
+
+
+def matches(query, id, source):
+    """Evaluate the supported subset of the query DSL against a source
+    """
+    if 'filtered' in query:
+        filtered = query['filtered']
+        query = {'bool': {
+            'must': [filtered.get('query', {'match_all': {}})],
+            'filter': [filtered.get('filter', {'match_all': {}})],
+        }}
+    (kind, spec), = query.items()
+    if kind == 'match_all':
+        return True
+    if kind == 'ids':
+        return id in [unicode(v) for v in spec['values']]
+    if kind in ('term', 'terms', 'match'):
+        (field, expected), = spec.items()
+        if isinstance(expected, dict):
+            expected = expected.get('value', expected.get('query'))
+        if not isinstance(expected, (list, tuple)):
+            expected = [expected]
+        if field == '_id':
+            return id in [unicode(v) for v in expected]
+        return bool(set(map(hashable, lookup(source, field)))
+                    & set(map(hashable, expected)))
+    if kind == 'exists':
+        return bool(lookup(source, spec['field']))
+    if kind == 'range':
+        (field, bounds), = spec.items()
+        values = lookup(source, field)
+        for value in values:
+            if ('gt' in bounds and not value > bounds['gt']
+                    or 'gte' in bounds and not value >= bounds['gte']
+                    or 'lt' in bounds and not value < bounds['lt']
+                    or 'lte' in bounds and not value <= bounds['lte']):
+                continue
+            return True
+        return False
+    if kind == 'bool':
+        def clauses(name):
+            value = spec.get(name, [])
+            if isinstance(value, dict):
+                value = [value]
+            return value
+        for clause in clauses('must') + clauses('filter'):
+            if not matches(clause, id, source):
+                return False
+        for clause in clauses('must_not'):
+            if matches(clause, id, source):
+                return False
+        should = clauses('should')
+        if should and not any(matches(c, id, source) for c in should):
+            return False
+        return True
+    raise ValueError('Unsupported query type %r' % kind)
+
+
+def hashable(value):
+    if isinstance(value, (dict, list)):
+        return repr(value)
+    return value
@@ -0,0 +1,38 @@
+import gc
+import sys
+import types
+
+
+# objects which are shared and not owned by a single instance
+_SHARED_TYPES = (type, types.ClassType, types.FunctionType,
+                 types.MethodType, types.ModuleType)
+
+
+def deep_sizeof(obj, exclude=()):
+    """Provide the number of bytes used by an object and the objects it owns
+
+    The referenced objects are found with the garbage collector so slots and
+    instance dicts are included without allocating them. Classes, functions,
+    modules and the objects in `exclude` are not counted. Objects referenced
+    more than once are counted once.
+    """
+    seen = set(id(o) for o in exclude)
+    size = 0
+    stack = [obj]
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen or isinstance(obj, _SHARED_TYPES):
+            continue
+        seen.add(id(obj))
+        size += sys.getsizeof(obj)
+        stack.extend(gc.get_referents(obj))
+    return size
+
+
+def bytes_per_object(objects, exclude=()):
+    """Provide the average number of bytes used by the objects
+    """
+    if not objects:
+        return 0
+    size = deep_sizeof(objects, exclude) - sys.getsizeof(objects)
+    return size // len(objects)
@@ -0,0 +1,260 @@
+import argparse
+import gc
+import json
+import platform
+import sys
+import time
+import types
+from collections import OrderedDict
+from timeit import default_timer
+
+from .. import VERSION
+
+
+# all registered benchmarks by name
+BENCHMARKS = OrderedDict()
+
+# the result keys which are not additional metrics
+TIMING_KEYS = ('ops', 'best', 'mean', 'per_op_us', 'ops_per_sec')
+
+
+class Benchmark(object):
+    """A registered benchmark
+
+    `factory` is called with the number of operations and must return a
+    callable which runs the operations. The factory can also return a tuple
+    (callable, metrics) where metrics is a dict with additional values which
+    are added to the result.
+
+    A factory which needs to clean up is a generator yielding the callable
+    or the tuple. The generator is closed after the operations ran, the
+    clean up is done in `finally` blocks or `with` statements around the
+    yield.
+    """
+
+    def __init__(self, name, factory):
+        self.name = name
+        self.factory = factory
+        self.doc = (factory.__doc__ or '').strip()
+
+    def run(self, size, repeat, timer=default_timer):
+        func = self.factory(size)
+        setup = None
+        if isinstance(func, types.GeneratorType):
+            setup = func
+            func = next(setup)
+        metrics = {}
+        if isinstance(func, tuple):
+            func, metrics = func
+        try:
+            timings = self._time(func, repeat, timer)
+        finally:
+            if setup is not None:
+                setup.close()
+        best = min(timings)
+        result = {
+            'ops': size,
+            'best': best,
+            'mean': sum(timings) / len(timings),
+            'per_op_us': best / size * 1000000,
+            'ops_per_sec': best and size / best or None,
+        }
+        result.update(metrics)
+        return result
+
+    def _time(self, func, repeat, timer):
+        timings = []
+        # like timeit the garbage collector is disabled while timing
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            for i in range(repeat):
+                start = timer()
+                func()
+                timings.append(timer() - start)
+        finally:
+            if gc_enabled:
+                gc.enable()
+        return timings
+
+
+def benchmark(name):
+    """Decorator to register a benchmark factory
+    """
+    def register(factory):
+        BENCHMARKS[name] = Benchmark(name, factory)
+        return factory
+    return register
+
+
+def benchmark_variants(name, variants):
+    """Decorator to register a benchmark factory for several variants
+
+    A variant is a tuple (label, argument) or a value which is used as label
+    and argument. The benchmarks are registered as `name % label`, the
+    factory is called with the number of operations and the argument.
+    """
+    def register(factory):
+        for variant in variants:
+            if isinstance(variant, tuple):
+                label, argument = variant
+            else:
+                label = argument = variant
+            benchmark(name % (label,))(_bind(factory, argument))
+        return factory
+    return register
+
+
+def _bind(factory, argument):
+    def bound(size):
+        return factory(size, argument)
+    bound.__doc__ = factory.__doc__
+    return bound
+
+
+def load_benchmarks():
+    """Import the modules which register the benchmarks
+    """
+    from . import suite  # noqa
+
+
+def select(patterns=None):
+    """Provide the benchmarks with a name containing one of the patterns
+    """
+    load_benchmarks()
+    if not patterns:
+        return BENCHMARKS.values()
+    return [b for name, b in BENCHMARKS.items()
+            if any(p in name for p in patterns)]
+
+
+def run_benchmarks(patterns=None, size=1000, repeat=5, report=None):
+    """Run the benchmarks and provide a JSON serializable result
+
+    `report` is called with the name and the result of every finished
+    benchmark.
+    """
+    results = OrderedDict()
+    for bench in select(patterns):
+        results[bench.name] = bench.run(size, repeat)
+        if report is not None:
+            report(bench.name, results[bench.name])
+    return {
+        'meta': {
+            'version': VERSION,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'timestamp': int(time.time()),
+            'size': size,
+            'repeat': repeat,
+        },
+        'results': results,
+    }
+
+
+def compare(old, new, tolerance=0.1):
+    """Compare two benchmark results
+
+    Returns a list of dicts ordered by the benchmark name with the per
+    operation times of both results and their ratio. A benchmark is marked
+    as regression if the new result is slower by more than `tolerance`.
+    Additional metrics of the benchmarks are provided as a list of tuples
+    (name, before, after).
+    """
+    rows = []
+    old_results = old['results']
+    new_results = new['results']
+    for name in sorted(new_results):
+        if name not in old_results:
+            continue
+        before = old_results[name]['per_op_us']
+        after = new_results[name]['per_op_us']
+        ratio = before and after / before or None
+        if ratio is None:
+            status = ''
+        elif ratio > 1 + tolerance:
+            status = 'slower'
+        elif ratio < 1 - tolerance:
+            status = 'faster'
+        else:
+            status = ''
+        metrics = [(key, old_results[name].get(key), value)
+                   for key, value in sorted(new_results[name].items())
+                   if key not in TIMING_KEYS]
+        rows.append({
+            'name': name,
+            'before': before,
+            'after': after,
+            'ratio': ratio,
+            'status': status,
+            'metrics': metrics,
+        })
+    return rows
+
+
+def format_result(name, result):
+    return '%-40s %12.3f us/op %12.0f ops/s' % (
+                name, result['per_op_us'], result['ops_per_sec'] or 0)
+
+
+def format_comparison(rows):
+    lines = ['%-40s %12s %12s %8s' % ('benchmark', 'before us', 'after us',
+                                      'ratio')]
+    for row in rows:
+        lines.append('%-40s %12.3f %12.3f %8.2f %s' % (row['name'],
+                                                       row['before'],
+                                                       row['after'],
+                                                       row['ratio'] or 0,
+                                                       row['status']))
+        for metric, before, after in row.get('metrics', ()):
+            lines.append('    %-36s %12s %12s' % (metric, before, after))
+    return '\n'.join(line.rstrip() for line in lines)
+
+
+def main(argv=None, out=None):
+    """The `esdb-benchmark` script
+    """
+    out = out or sys.stdout
+    parser = argparse.ArgumentParser(
+        description='Run the lovely.esdb benchmarks')
+    commands = parser.add_subparsers(dest='command')
+    run_cmd = commands.add_parser('run', help='run the benchmarks')
+    run_cmd.add_argument('-k', dest='patterns', action='append',
+                         help='only run benchmarks containing the pattern')
+    run_cmd.add_argument('-n', '--size', type=int, default=1000,
+                         help='number of operations per benchmark')
+    run_cmd.add_argument('-r', '--repeat', type=int, default=5,
+                         help='number of repetitions, the best is used')
+    run_cmd.add_argument('-o', '--output',
+                         help='write the JSON result to this file')
+    commands.add_parser('list', help='list the benchmarks')
+    compare_cmd = commands.add_parser('compare',
+                                      help='compare two JSON results')
+    compare_cmd.add_argument('old')
+    compare_cmd.add_argument('new')
+    compare_cmd.add_argument('--tolerance', type=float, default=0.1)
+    args = parser.parse_args(argv)
+
+    if args.command == 'list':
+        for bench in select():
+            out.write('%-40s %s\n' % (bench.name, bench.doc))
+    elif args.command == 'run':
+        def report(name, result):
+            out.write(format_result(name, result) + '\n')
+        result = run_benchmarks(args.patterns,
+                                size=args.size,
+                                repeat=args.repeat,
+                                report=report)
+        if args.output:
+            with open(args.output, 'w') as f:
+                json.dump(result, f, indent=2)
+    elif args.command == 'compare':
+        with open(args.old) as f:
+            old = json.load(f, object_pairs_hook=OrderedDict)
+        with open(args.new) as f:
+            new = json.load(f, object_pairs_hook=OrderedDict)
+        rows = compare(old, new, args.tolerance)
+        out.write(format_comparison(rows) + '\n')
+        if any(row['status'] == 'slower' for row in rows):
+            return 1
+    return 0
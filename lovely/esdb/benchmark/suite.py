@@ -0,0 +1,722 @@
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+from datetime import datetime
+
+import dateutil.parser
+
+from ..codec import available_codecs, get_codec
+from ..diagnostics.workload import (
+    WorkloadDocument,
+    WorkloadObject,
+    create_documents,
+    raw_hits,
+    read_documents,
+)
+from ..document import (
+    Document,
+    LazyDocument,
+    Bulk,
+    BulkProcessor,
+    DocumentSync,
+    IngestPipeline,
+    LocalReplica,
+)
+from ..document.columns import ColumnBuilder
+from ..document.document import EMPTY_STORE
+from ..document.replica import write_replica
+from ..properties import (
+    Property,
+    LocalRelation,
+    ObjectProperty,
+    IntegerProperty,
+    FloatProperty,
+    DatetimeProperty,
+    ListProperty,
+)
+from ..properties.decodecache import DecodeCache
+from ..properties.isoformat import parse_datetime
+from ..properties.objectproperty import encode, decode
+from .fakees import FakeElasticsearch
+from .memory import bytes_per_object
+from .runner import benchmark, benchmark_variants
+
+
+class BenchAuthor(Document):
+    INDEX = 'bench_authors'
+
+    id = Property(primary_key=True)
+    name = Property(default=u'')
+
+
+class BenchBook(Document):
+    INDEX = 'bench_books'
+
+    id = Property(primary_key=True)
+    author_id = Property()
+    author = LocalRelation('author_id', 'BenchAuthor.id')
+
+
+class BenchTyped(Document):
+    INDEX = 'bench_typed'
+
+    id = Property(primary_key=True)
+    count = IntegerProperty()
+    weight = FloatProperty()
+    created = DatetimeProperty()
+    ranks = ListProperty(IntegerProperty())
+
+
+class BenchValues(object):
+    """The typed values stored in an object property
+    """
+
+    def __init__(self, count=None, weight=None, created=None, ranks=None):
+        self.count = count
+        self.weight = weight
+        self.created = created
+        self.ranks = ranks
+
+
+class BenchPickled(Document):
+    INDEX = 'bench_pickled'
+
+    id = Property(primary_key=True)
+    values = ObjectProperty()
+
+
+def row_values(size):
+    return [{'id': unicode(i),
+             'title': u'document %s' % i,
+             'number': i,
+             'tags': [u'tag%s' % (i % 10), u'all'],
+             'info': {u'nested': {u'value': i}}}
+            for i in xrange(size)]
+
+
+@contextmanager
+def fake_client(doc_classes=(WorkloadDocument,), rows=0, latency=0):
+    """Use a fake elasticsearch client for the document classes
+
+    `rows` workload documents are indexed. The previous clients of the
+    classes are restored afterwards.
+    """
+    client = FakeElasticsearch(latency=latency)
+    previous = [(cls, cls.ES) for cls in doc_classes]
+    for cls in doc_classes:
+        cls.ES = client
+    try:
+        if rows:
+            WorkloadDocument.bulk_rows(row_values(rows))
+        yield client
+    finally:
+        for cls, es in previous:
+            cls.ES = es
+
+
+@contextmanager
+def temp_dir():
+    """Provide a temporary directory which is removed afterwards
+    """
+    path = tempfile.mkdtemp()
+    try:
+        yield path
+    finally:
+        shutil.rmtree(path)
+
+
+@benchmark('document.construct')
+def construct(size):
+    """Create documents with all properties set
+    """
+    def run():
+        create_documents(size)
+    return run
+
+
+@benchmark('document.from_raw_es_data')
+def from_raw_es_data(size):
+    """Hydrate documents from raw hits
+    """
+    hits = raw_hits(create_documents(size))
+
+    def run():
+        [WorkloadDocument.from_raw_es_data(hit) for hit in hits]
+    return run
+
+
+@benchmark('document.from_raw_es_hits')
+def from_raw_es_hits(size):
+    """Hydrate documents from a list of raw hits
+    """
+    hits = raw_hits(create_documents(size))
+
+    def run():
+        WorkloadDocument.from_raw_es_hits(hits)
+    return run
+
+
+@benchmark('document.store_body')
+def store_body(size):
+    """Build the body to index a document
+    """
+    docs = create_documents(size)
+
+    def run():
+        for doc in docs:
+            doc._get_store_index_body()
+    return run
+
+
+@benchmark('document.get_source')
+def get_source(size):
+    """Provide the JSON source of a document
+    """
+    docs = create_documents(size)
+
+    def run():
+        for doc in docs:
+            doc.get_source()
+    return run
+
+
+@benchmark('document.read_properties')
+def read_properties(size):
+    """Read all properties of hydrated documents
+    """
+    hits = raw_hits(create_documents(size))
+
+    def run():
+        for hit in hits:
+            doc = WorkloadDocument.from_raw_es_data(hit)
+            doc.id
+            doc.title
+            doc.number
+            doc.tags
+            doc.info
+            doc.obj
+    return run
+
+
+@benchmark_variants('store.%s', ['index', 'incremental'])
+def store_mode(size, mode):
+    """Store a changed property and report the request bytes
+    """
+    with fake_client():
+        docs = create_documents(size + 1)
+        for doc in docs:
+            doc.info[u'text'] = u'text ' * 400
+            doc.store()
+        # the first document is used to measure the request size
+        doc = docs.pop(0)
+        doc.number += 1
+        if mode == 'incremental':
+            body = doc._get_store_incremental_body()
+        else:
+            body = doc._get_store_index_body()
+        request_bytes = len(doc._codec().dumps(body))
+
+        def run():
+            for doc in docs:
+                doc.number += 1
+                doc.store(mode=mode)
+        yield run, {'request_bytes': request_bytes}
+
+
+def typed_values(i):
+    return dict(count=i,
+                weight=i / 3.0,
+                created=datetime(2016, 10, 1, 12, 0, i % 60),
+                ranks=[i, i + 1, i + 2])
+
+
+def create_typed(i):
+    return BenchTyped(id=unicode(i), **typed_values(i))
+
+
+def read_typed(doc):
+    doc.count
+    doc.weight
+    doc.created
+    doc.ranks
+
+
+def create_pickled(i):
+    return BenchPickled(id=unicode(i), values=BenchValues(**typed_values(i)))
+
+
+def read_pickled(doc):
+    values = doc.values
+    values.count
+    values.weight
+    values.created
+    values.ranks
+
+
+@benchmark_variants('typed.%s',
+                    [('properties', (create_typed, read_typed)),
+                     ('objectproperty', (create_pickled, read_pickled))])
+def typed(size, functions):
+    """Build the store body, hydrate and read typed values
+    """
+    create, read = functions
+    docs = [create(i) for i in xrange(size)]
+    doc_class = docs[0].__class__
+
+    def run():
+        for doc in docs:
+            source = doc._get_store_index_body()
+            read(doc_class.from_raw_es_data({'_id': doc.id,
+                                             '_version': 1,
+                                             '_source': source}))
+    return run
+
+
+@benchmark('objectproperty.roundtrip')
+def objectproperty_roundtrip(size):
+    """Encode and decode an object
+    """
+    obj = WorkloadObject(u'name', [u'a', u'b', u'c'])
+
+    def run():
+        for i in xrange(size):
+            decode(encode(obj))
+    return run
+
+
+@benchmark_variants('objectproperty.payload.%s',
+                    [('plain', None), ('zlib', 0)])
+def payload(size, compress_threshold):
+    """Encode and decode a larger object and report the payload bytes
+    """
+    obj = WorkloadObject(u'name', [u'tag %s' % i for i in xrange(50)])
+    data = encode(obj, compress_threshold=compress_threshold)
+    payload_bytes = len(data['object_json_pickle__'])
+
+    def run():
+        for i in xrange(size):
+            decode(encode(obj, compress_threshold=compress_threshold))
+    return run, {'payload_bytes': payload_bytes}
+
+
+@benchmark_variants('objectproperty.shared_payload.%s',
+                    [('uncached', None), 'copy', 'immutable'])
+def shared_payload(size, mode):
+    """Decode an object shared by all documents
+    """
+    obj = WorkloadObject(u'shared', [u'tag %s' % i for i in xrange(20)])
+    data = encode(obj)
+    cache = mode and DecodeCache(mode=mode)
+    payload = data['object_json_pickle__']
+
+    def decoder(payload):
+        return decode(data)
+
+    def run():
+        for i in xrange(size):
+            if cache:
+                cache.decode(payload, decoder)
+            else:
+                decode(data)
+    if not cache:
+        return run
+    # one run to report the hit rate
+    run()
+    return run, {'hit_rate': cache.hit_rate}
+
+
+@benchmark('objectproperty.timestamps')
+def objectproperty_timestamps(size):
+    """Decode an object containing many datetimes
+    """
+    obj = WorkloadObject(u'name', [datetime(2016, 3, 14, 8, i, 0, i)
+                                   for i in xrange(20)])
+    data = encode(obj)
+
+    def run():
+        for i in xrange(size):
+            decode(data)
+    return run
+
+
+@benchmark_variants('datetime.parse.%s',
+                    [('isoformat', parse_datetime),
+                     ('dateutil', dateutil.parser.parse)])
+def datetime_parse(size, parse):
+    """Parse ISO 8601 timestamps created by `isoformat()`
+    """
+    values = [datetime(2016, 3, 14, 8, i % 60, 0, i).isoformat()
+              for i in xrange(size)]
+
+    def run():
+        for value in values:
+            parse(value)
+    return run
+
+
+@benchmark('relation.resolve')
+def relation_resolve(size):
+    """Resolve a 1:1 relation from the store
+    """
+    with fake_client((BenchAuthor, BenchBook)) as client:
+        bulk = Bulk(client)
+        books = []
+        for i in xrange(size):
+            bulk.store(BenchAuthor(id=unicode(i), name=u'author %s' % i))
+            book = BenchBook(id=unicode(i))
+            book.author = unicode(i)
+            books.append(book)
+        bulk.flush()
+
+        def run():
+            for book in books:
+                book.author()
+        yield run
+
+
+@benchmark('lazy.attribute_access')
+def lazy_attribute_access(size):
+    """Read properties through a resolved LazyDocument
+    """
+    docs = [LazyDocument(doc) for doc in create_documents(size)]
+
+    def run():
+        for doc in docs:
+            doc.title
+            doc.number
+            doc.tags
+    return run
+
+
+@benchmark('lazy.loaded_attribute_access')
+def lazy_loaded_attribute_access(size):
+    """Read properties through a LazyDocument loaded by its primary key
+    """
+    with fake_client() as client:
+        bulk = Bulk(client)
+        for doc in create_documents(size):
+            bulk.store(doc)
+        bulk.flush()
+        docs = [LazyDocument(WorkloadDocument, unicode(i))
+                for i in xrange(size)]
+        for doc in docs:
+            # load the document
+            doc.title
+
+        def run():
+            for doc in docs:
+                doc.title
+                doc.number
+                doc.tags
+        yield run
+
+
+@benchmark('lazy.primary_key_access')
+def lazy_primary_key_access(size):
+    """Read the primary key of a not loaded LazyDocument
+    """
+    docs = [LazyDocument(WorkloadDocument, unicode(i)) for i in xrange(size)]
+
+    def run():
+        for doc in docs:
+            doc.id
+    return run
+
+
+@benchmark('lazy.direct_access')
+def lazy_direct_access(size):
+    """Read the properties of lazy.attribute_access without a proxy
+    """
+    docs = create_documents(size)
+
+    def run():
+        for doc in docs:
+            doc.title
+            doc.number
+            doc.tags
+    return run
+
+
+@benchmark('bulk.processor')
+def bulk_processor(size):
+    """Index documents through a BulkProcessor with 4 workers
+    """
+    with fake_client() as client:
+        docs = create_documents(size)
+
+        def run():
+            processor = BulkProcessor(client, workers=4, batch_size=100,
+                                      flush_interval=0.01)
+            for doc in docs:
+                processor.store(doc)
+            processor.close()
+        yield run
+
+
+@benchmark('rows.documents')
+def rows_documents(size):
+    """Build the bulk index actions for rows by creating documents
+    """
+    rows = row_values(size)
+
+    def run():
+        bulk = Bulk(None)
+        for row in rows:
+            bulk.store(WorkloadDocument(**row))
+    return run
+
+
+@benchmark('rows.direct')
+def rows_bulk_rows(size):
+    """Build the bulk index actions for rows with bulk_rows
+    """
+    rows = row_values(size)
+
+    def run():
+        WorkloadDocument.bulk_rows(rows, bulk=Bulk(None))
+    return run
+
+
+def typed_hits(size):
+    hits = []
+    for i in xrange(size):
+        doc = BenchTyped(id=unicode(i), **typed_values(i))
+        hits.append({'_id': doc.id,
+                     '_version': 1,
+                     '_source': doc._get_store_index_body()})
+    return hits
+
+
+@benchmark('export.hydrated')
+def export_hydrated(size):
+    """Collect the numeric values of hits by hydrating documents
+    """
+    hits = typed_hits(size)
+
+    def run():
+        docs = BenchTyped.from_raw_es_hits(hits)
+        [doc.count for doc in docs]
+        [doc.weight for doc in docs]
+    return run
+
+
+@benchmark('export.columns')
+def export_columns(size):
+    """Collect the numeric values of hits as columns
+    """
+    hits = typed_hits(size)
+
+    def run():
+        builder = ColumnBuilder(BenchTyped, ['count', 'weight'], 'array')
+        builder.add(hits)
+        builder.result()
+    return run
+
+
+@benchmark('snapshot.export')
+def snapshot_export(size):
+    """Export documents to a snapshot file
+    """
+    with fake_client(rows=size), temp_dir() as tmp:
+        path = os.path.join(tmp, 'snapshot.json.gz')
+
+        def run():
+            WorkloadDocument.export(path)
+        yield run
+
+
+@benchmark('snapshot.import')
+def snapshot_import(size):
+    """Import documents from a snapshot file
+    """
+    with fake_client(rows=size), temp_dir() as tmp:
+        path = os.path.join(tmp, 'snapshot.json.gz')
+        WorkloadDocument.export(path)
+
+        def run():
+            WorkloadDocument.import_(path)
+        yield run
+
+
+@benchmark_variants('scan.slices_%s', [1, 4])
+def scan(size, slices):
+    """Scan raw hits with 1ms latency per request
+    """
+    with fake_client(rows=size, latency=0.001):
+        def run():
+            for hit in WorkloadDocument.scan(resolve_hits=False,
+                                             size=50,
+                                             slices=slices):
+                pass
+        yield run
+
+
+@benchmark('byquery.store')
+def byquery_store(size):
+    """Change a property of all documents by loading and storing them
+    """
+    with fake_client(rows=size, latency=0.0001):
+        def run():
+            for doc in WorkloadDocument.scan():
+                doc.number += 1
+                doc.store()
+        yield run
+
+
+@benchmark('byquery.update_where')
+def byquery_update_where(size):
+    """Change a property of all documents with an update by query
+    """
+    with fake_client(rows=size, latency=0.0001):
+        def run():
+            WorkloadDocument.update_where(set={'number': 0})
+        yield run
+
+
+@benchmark('sync.reload')
+def sync_reload(size):
+    """Reload all documents into a dict
+    """
+    with fake_client(rows=size):
+        def run():
+            dict((doc.id, doc) for doc in WorkloadDocument.scan())
+        yield run
+
+
+@benchmark('sync.poll')
+def sync_poll(size):
+    """Poll the changed documents of a synced dict
+    """
+    with fake_client(rows=size):
+        sync = DocumentSync(WorkloadDocument, 'number')
+        sync.load()
+
+        def run():
+            sync.poll()
+        yield run
+
+
+@benchmark_variants('replica.%s', ['es', 'local'])
+def replica(size, source):
+    """Get all documents one by one
+    """
+    with fake_client(rows=size), temp_dir() as tmp:
+        path = os.path.join(tmp, 'replica')
+        write_replica(WorkloadDocument, path)
+        local = LocalReplica(WorkloadDocument, path)
+        get = source == 'local' and local.get or WorkloadDocument.get
+        ids = [unicode(i) for i in xrange(size)]
+
+        def run():
+            for id in ids:
+                get(id)
+        try:
+            yield run
+        finally:
+            local.close()
+
+
+@benchmark_variants('ingest.processes_%s', [0, 1, 2, 4])
+def ingest(size, processes):
+    """Index raw records with the ingest pipeline
+    """
+    client = FakeElasticsearch()
+    records = [{'id': unicode(i),
+                'title': u'document %s' % i,
+                'number': i,
+                'tags': [u'tag%s' % (i % 10), u'all'],
+                'info': {u'nested': {u'value': i}},
+                'obj': WorkloadObject(u'object %s' % i, [u'a', u'b'])}
+               for i in xrange(size)]
+    pipeline = IngestPipeline(WorkloadDocument,
+                              client,
+                              processes=processes,
+                              chunk_size=100)
+
+    def run():
+        pipeline.run(records)
+    return run
+
+
+@benchmark('bulk.store')
+def bulk_store(size):
+    """Index documents with a bulk request
+    """
+    with fake_client() as client:
+        docs = create_documents(size)
+
+        def run():
+            bulk = Bulk(client)
+            for doc in docs:
+                bulk.store(doc)
+            bulk.flush()
+        yield run
+
+
+@benchmark('memory.document')
+def memory_hydrated_document(size):
+    """Hydrate documents and report the bytes per document
+    """
+    hits = raw_hits(create_documents(size))
+    docs = WorkloadDocument.from_raw_es_hits(hits)
+    hydrated = bytes_per_object(docs, exclude=[EMPTY_STORE])
+    read_documents(docs)
+    read = bytes_per_object(docs, exclude=[EMPTY_STORE])
+
+    def run():
+        WorkloadDocument.from_raw_es_hits(hits)
+    return run, {'bytes_per_doc': hydrated, 'bytes_per_read_doc': read}
+
+
+@benchmark('memory.resolver')
+def memory_relation_resolver(size):
+    """Create relation resolvers and report the bytes per resolver
+    """
+    book = BenchBook(id=u'1', author_id=u'1')
+    resolvers = [book.author for i in xrange(size)]
+    per_resolver = bytes_per_object(resolvers, exclude=[book, EMPTY_STORE])
+
+    def run():
+        for i in xrange(size):
+            book.author
+    return run, {'bytes_per_resolver': per_resolver}
+
+
+@benchmark_variants('codec.%s.dumps', available_codecs())
+def codec_dumps(size, name):
+    """Serialize document sources with the codec
+    """
+    codec = get_codec(name)
+    sources = raw_hits(create_documents(size))
+
+    def run():
+        for source in sources:
+            codec.dumps(source)
+    return run
+
+
+@benchmark_variants('codec.%s.loads', available_codecs())
+def codec_loads(size, name):
+    """Deserialize document sources with the codec
+    """
+    codec = get_codec(name)
+    sources = [codec.dumps(s) for s in raw_hits(create_documents(size))]
+
+    def run():
+        for source in sources:
+            codec.loads(source)
+    return run
+
+
+@benchmark_variants('codec.%s.objectproperty', available_codecs())
+def codec_objectproperty(size, name):
+    """Encode and decode an object with the codec
+    """
+    codec = get_codec(name)
+    obj = WorkloadObject(u'name', [u'a', u'b', u'c'])
+
+    def run():
+        for i in xrange(size):
+            decode(encode(obj, codec), codec)
+    return run
@@ -0,0 +1,188 @@
+import json
+import uuid
+from collections import OrderedDict
+from datetime import date
+from decimal import Decimal
+
+from elasticsearch.exceptions import SerializationError
+from elasticsearch.serializer import JSONSerializer
+
+
+def default(obj):
+    """Serialize the types which are supported by the elasticsearch client
+    """
+    if isinstance(obj, date):
+        return obj.isoformat()
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if isinstance(obj, uuid.UUID):
+        return str(obj)
+    raise TypeError("Unable to serialize %r (type: %s)" % (obj, type(obj)))
+
+
+class Codec(object):
+    """A JSON codec
+
+    `dumps` serializes a python structure to a JSON string and `loads`
+    creates the python structure from a JSON string.
+
+    A codec can also be used as jsonpickle backend.
+    """
+
+    def __init__(self, name, dumps, loads):
+        self.name = name
+        self.dumps = dumps
+        self.loads = loads
+
+    def encode(self, obj, **kwargs):
+        """Serialize for jsonpickle
+
+        jsonpickle passes formatting arguments like `indent` and `separators`
+        to its backends, the codecs always produce compact JSON.
+        """
+        return self.dumps(obj)
+
+    def decode(self, s, **kwargs):
+        """Deserialize for jsonpickle
+        """
+        return self.loads(s)
+
+    def __repr__(self):
+        return '<Codec %s>' % self.name
+
+
+def json_codec():
+    """The codec using the json module of the standard library
+    """
+    encoder = json.JSONEncoder(default=default)
+    decoder = json.JSONDecoder()
+    return Codec('json', encoder.encode, decoder.decode)
+
+
+def simplejson_codec():
+    """The codec using simplejson with its C speedups
+    """
+    import simplejson
+    encoder = simplejson.JSONEncoder(default=default)
+    decoder = simplejson.JSONDecoder()
+    return Codec('simplejson', encoder.encode, decoder.decode)
+
+
+def ujson_codec():
+    """The codec using ujson
+
+    ujson has no hook for types which are not supported by JSON. Structures
+    ujson can't serialize are serialized with the json module.
+    """
+    import ujson
+    fallback = json_codec()
+
+    def dumps(obj):
+        try:
+            return ujson.dumps(obj, ensure_ascii=True)
+        except (TypeError, OverflowError):
+            return fallback.dumps(obj)
+
+    def loads(s):
+        return ujson.loads(s, precise_float=True)
+    return Codec('ujson', dumps, loads)
+
+
+# the factories of the known codecs, ordered by preference
+CODEC_FACTORIES = OrderedDict([
+    ('ujson', ujson_codec),
+    ('simplejson', simplejson_codec),
+    ('json', json_codec),
+])
+
+# the created codecs by name
+_codecs = {}
+# the codec used if no codec is requested
+_default_codec = 'json'
+
+
+def register_codec(name, factory):
+    """Register a codec factory
+
+    The factory is called once to create the codec. It must raise an
+    ImportError if the codec is not available.
+    """
+    CODEC_FACTORIES[name] = factory
+    _codecs.pop(name, None)
+
+
+def available_codecs():
+    """Provide the names of the codecs which can be used
+    """
+    names = []
+    for name in CODEC_FACTORIES:
+        try:
+            get_codec(name)
+        except ValueError:
+            continue
+        names.append(name)
+    return names
+
+
+def get_codec(codec=None):
+    """Provide a codec
+
+    `codec` can be a `Codec`, the name of a registered codec or 'fastest'
+    for the first available codec. If `codec` is None the default codec is
+    provided.
+    """
+    if codec is None:
+        codec = _default_codec
+    if isinstance(codec, Codec):
+        return codec
+    if codec == 'fastest':
+        codec = available_codecs()[0]
+    try:
+        return _codecs[codec]
+    except KeyError:
+        pass
+    if codec not in CODEC_FACTORIES:
+        raise ValueError('Unknown JSON codec "%s"' % codec)
+    try:
+        instance = CODEC_FACTORIES[codec]()
+    except ImportError:
+        raise ValueError('JSON codec "%s" is not available' % codec)
+    _codecs[codec] = instance
+    return instance
+
+
+def set_default_codec(codec):
+    """Set the codec which is used if a document class defines no codec
+    """
+    global _default_codec
+    # make sure the codec is available
+    _default_codec = get_codec(codec)
+    return _default_codec
+
+
+class CodecSerializer(JSONSerializer):
+    """A serializer for the elasticsearch client using a codec
+
+    Use it to decode the responses with a faster codec:
+
+        Elasticsearch(hosts, serializer=CodecSerializer('fastest'))
+
+    If no codec is provided the default codec is used.
+    """
+
+    def __init__(self, codec=None):
+        self.codec = codec
+
+    def loads(self, s):
+        try:
+            return get_codec(self.codec).loads(s)
+        except (ValueError, TypeError) as e:
+            raise SerializationError(s, e)
+
+    def dumps(self, data):
+        if isinstance(data, basestring):
+            return data
+        try:
+            return get_codec(self.codec).dumps(data)
+        except (ValueError, TypeError) as e:
+            raise SerializationError(data, e)
@@ -0,0 +1,15 @@
+from .instrumentation import (  # noqa
+    INSTRUMENTATION,
+    HistogramRecorder,
+    LatencyHistogram,
+    RequestEvent,
+    StatsdExporter,
+    udp_writer,
+)
+from .nplusone import (  # noqa
+    LoadDetector,
+    NPlusOneError,
+    NPlusOneWarning,
+    detect_n_plus_one,
+)
+from .profiling import PROFILER, Profiler, profile  # noqa
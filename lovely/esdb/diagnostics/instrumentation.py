@@ -0,0 +1,340 @@
+import json
+import logging
+import socket
+import threading
+import time
+
+
+logger = logging.getLogger(__name__)
+
+
+class RequestEvent(object):
+    """Describes a single request sent to elasticsearch
+
+    Instances of this class are passed to the instrumentation hooks after a
+    request has finished.
+    """
+
+    def __init__(self,
+                 operation,
+                 doc_class,
+                 index,
+                 latency,
+                 payload_bytes=None,
+                 hits=None,
+                 took=None,
+                 error=None
+                ):
+        self.operation = operation
+        self.doc_class = doc_class
+        self.index = index
+        # the latency in seconds measured on the client side
+        self.latency = latency
+        self.payload_bytes = payload_bytes
+        self.hits = hits
+        # the time in milliseconds elasticsearch reported for the request
+        self.took = took
+        self.error = error
+
+    @property
+    def class_name(self):
+        if self.doc_class is None:
+            return None
+        return self.doc_class.__name__
+
+    def __repr__(self):
+        return '<%s %s %s[%s] %.3fms>' % (self.__class__.__name__,
+                                          self.operation,
+                                          self.class_name,
+                                          self.index,
+                                          self.latency * 1000)
+
+
+class Instrumentation(object):
+    """Measures elasticsearch requests and notifies the subscribed hooks
+
+    A hook is a callable which gets a `RequestEvent` as argument. If no hook
+    is subscribed the requests are sent without any measurement.
+    """
+
+    def __init__(self):
+        self.hooks = ()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return bool(self.hooks)
+
+    def subscribe(self, hook):
+        """Subscribe a hook, returns the hook
+        """
+        with self._lock:
+            self.hooks = self.hooks + (hook,)
+        return hook
+
+    def unsubscribe(self, hook):
+        with self._lock:
+            self.hooks = tuple(h for h in self.hooks if h is not hook)
+
+    def request(self, operation, doc_class, index_name, payload, method,
+                *args, **kwargs):
+        """Call `method` with the given arguments and measure the request
+
+        `payload` is the data which is sent to elasticsearch. It is only
+        used to compute the payload size. Failures of the measurement and of
+        the hooks are logged, they never change the result of the request.
+        """
+        hooks = self.hooks
+        if not hooks:
+            return method(*args, **kwargs)
+        error = None
+        res = None
+        start = time.time()
+        try:
+            res = method(*args, **kwargs)
+            return res
+        except Exception as e:
+            error = e.__class__.__name__
+            raise
+        finally:
+            latency = time.time() - start
+            try:
+                event = RequestEvent(operation,
+                                     doc_class,
+                                     index_name,
+                                     latency,
+                                     payload_bytes=payload_size(payload),
+                                     hits=hit_count(operation, res),
+                                     took=took(res),
+                                     error=error)
+                self.notify(event, hooks)
+            except Exception:
+                logger.exception('Instrumentation of "%s" failed', operation)
+
+    def notify(self, event, hooks=None):
+        """Send an event to all hooks
+        """
+        for hook in hooks or self.hooks:
+            hook(event)
+
+
+# the instrumentation used by the documents and the bulk
+INSTRUMENTATION = Instrumentation()
+
+
+def payload_size(payload):
+    """The size of the JSON representation of the payload in bytes
+
+    For the actions of a bulk only the sizes of the sources are summed up,
+    sources which are already serialized are not serialized again.
+    """
+    if payload is None:
+        return 0
+    if isinstance(payload, basestring):
+        return len(payload)
+    if isinstance(payload, list):
+        return sum(payload_size(action.get('_source'))
+                   for action in payload)
+    return len(json.dumps(payload, default=repr))
+
+
+def took(res):
+    """The time in milliseconds elasticsearch reported in the response
+    """
+    if isinstance(res, dict):
+        return res.get('took')
+    return None
+
+
+def hit_count(operation, res):
+    """The number of documents contained in a response
+    """
+    if res is None:
+        return 0
+    if operation in ('search', 'scroll'):
+        return len(res['hits']['hits'])
+    if operation == 'mget':
+        return len([d for d in res['docs'] if d.get('found')])
+    if operation == 'get':
+        return res.get('found') and 1 or 0
+    if operation == 'count':
+        return res['count']
+    if operation == 'bulk':
+        # the result of the bulk helper: (success, errors)
+        return res[0]
+    return None
+
+
+class LatencyHistogram(object):
+    """A HDR style latency histogram
+
+    Values are recorded as integer microseconds in buckets with a fixed
+    relative precision given by the number of significant digits. Memory
+    usage only depends on the value range and not on the number of recorded
+    values.
+    """
+
+    def __init__(self, significant_digits=2):
+        self.significant_digits = significant_digits
+        # the number of bits needed to resolve all values with the requested
+        # precision
+        self._sub_bits = (2 * 10 ** significant_digits).bit_length()
+        self.counts = {}
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+
+    def record(self, latency):
+        """Record a latency given in seconds
+        """
+        value = int(latency * 1000000)
+        shift = max(0, value.bit_length() - self._sub_bits)
+        key = (shift, value >> shift)
+        self.counts[key] = self.counts.get(key, 0) + 1
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def percentile(self, percent):
+        """Provide the latency in milliseconds for the given percentile
+        """
+        if not self.count:
+            return None
+        limit = max(1, self.count * percent / 100.0)
+        seen = 0
+        for shift, sub in sorted(self.counts):
+            seen += self.counts[(shift, sub)]
+            if seen >= limit:
+                # the highest value which is equivalent to the bucket
+                value = ((sub + 1) << shift) - 1
+                return min(value, self.max) / 1000.0
+        return self.max / 1000.0
+
+    @property
+    def mean(self):
+        if not self.count:
+            return None
+        return self.total / 1000.0 / self.count
+
+    def summary(self, percentiles=(50, 90, 99, 99.9)):
+        """Provide a dict with the statistics of the histogram
+
+        All latencies are in milliseconds.
+        """
+        res = {
+            'count': self.count,
+            'min': None,
+            'max': None,
+            'mean': self.mean,
+        }
+        if self.count:
+            res['min'] = self.min / 1000.0
+            res['max'] = self.max / 1000.0
+        for p in percentiles:
+            res['p%s' % p] = self.percentile(p)
+        return res
+
+
+class HistogramRecorder(object):
+    """An instrumentation hook which records latency histograms
+
+    A histogram is maintained per operation and per operation and document
+    class.
+    """
+
+    def __init__(self, significant_digits=2):
+        self.significant_digits = significant_digits
+        self.histograms = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, event):
+        with self._lock:
+            for key in ((event.operation, None),
+                        (event.operation, event.class_name)):
+                if key not in self.histograms:
+                    self.histograms[key] = LatencyHistogram(
+                                                    self.significant_digits)
+                self.histograms[key].record(event.latency)
+
+    def histogram(self, operation, class_name=None):
+        return self.histograms.get((operation, class_name))
+
+    def percentile(self, operation, percent, class_name=None):
+        histogram = self.histogram(operation, class_name)
+        if histogram is None:
+            return None
+        return histogram.percentile(percent)
+
+    def report(self, percentiles=(50, 90, 99, 99.9)):
+        """Provide the summary of all histograms
+
+        Returns a list of dicts ordered by the highest percentile with the
+        slowest operations first.
+        """
+        rows = []
+        with self._lock:
+            for (operation, class_name), histogram in self.histograms.items():
+                row = histogram.summary(percentiles)
+                row['operation'] = operation
+                row['class'] = class_name
+                rows.append(row)
+        key = 'p%s' % percentiles[-1]
+        rows.sort(key=lambda row: (-row[key], row['operation'],
+                                   row['class']))
+        return rows
+
+    def reset(self):
+        with self._lock:
+            self.histograms = {}
+
+
+class StatsdExporter(object):
+    """An instrumentation hook which emits metrics in the StatsD format
+
+    `write` is called with every single metric line. This allows to collect
+    the lines locally or to send them to a StatsD daemon using
+    `udp_writer`.
+    """
+
+    def __init__(self, write, prefix='lovely.esdb'):
+        self.write = write
+        self.prefix = prefix
+
+    def __call__(self, event):
+        name = '.'.join((self.prefix,
+                         metric_name(event.operation),
+                         metric_name(event.class_name or 'none')))
+        self.write('%s.latency:%.3f|ms' % (name, event.latency * 1000))
+        if event.took is not None:
+            self.write('%s.took:%d|ms' % (name, event.took))
+        if event.payload_bytes:
+            self.write('%s.payload_bytes:%d|h' % (name, event.payload_bytes))
+        if event.hits is not None:
+            self.write('%s.hits:%d|h' % (name, event.hits))
+        if event.error is not None:
+            self.write('%s.errors.%s:1|c' % (name,
+                                             metric_name(event.error)))
+
+
+def metric_name(name):
+    """Make a name usable as part of a StatsD metric name
+    """
+    return str(name).replace('.', '_').replace(':', '_').replace('|', '_')
+
+
+def udp_writer(host='127.0.0.1', port=8125):
+    """Provide a writer for the `StatsdExporter` sending UDP packets
+    """
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def write(line):
+        try:
+            sock.sendto(line, (host, port))
+        except socket.error:
+            # metrics must never break the application
+            pass
+    return write
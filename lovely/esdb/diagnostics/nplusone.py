@@ -0,0 +1,138 @@
+import os
+import threading
+import traceback
+import warnings
+from contextlib import contextmanager
+
+
+# the frames of these files are not reported as call sites
+PACKAGE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_local = threading.local()
+
+
+class NPlusOneError(Exception):
+    """Raised in strict mode if too many single document loads are detected
+    """
+
+
+class NPlusOneWarning(UserWarning):
+    """Issued if too many single document loads are detected
+    """
+
+
+class LoadDetector(object):
+    """Counts single document loads from relations and lazy documents
+
+    Loads are counted per origin, an origin is either a relation of a
+    document class or a document class loaded through `LazyDocument`.
+
+    If the number of loads for an origin exceeds `threshold` a
+    `NPlusOneWarning` is issued or, in strict mode, `NPlusOneError` is
+    raised.
+    """
+
+    def __init__(self, threshold=5, strict=False, max_call_sites=5):
+        self.threshold = threshold
+        self.strict = strict
+        self.max_call_sites = max_call_sites
+        self.loads = {}
+        self.call_sites = {}
+        self.reported = set()
+
+    def record(self, kind, origin, remote_class):
+        """Record a single document load
+
+        kind is either 'relation' or 'lazy', origin describes where the
+        load came from.
+        """
+        key = (kind, origin)
+        count = self.loads.get(key, 0) + 1
+        self.loads[key] = count
+        sites = self.call_sites.setdefault(key, [])
+        site = call_site()
+        if site is not None and site not in sites:
+            sites.append(site)
+        if count > self.threshold and key not in self.reported:
+            self.reported.add(key)
+            message = self.message(kind, origin, remote_class, count)
+            if self.strict:
+                raise NPlusOneError(message)
+            warnings.warn(message, NPlusOneWarning)
+
+    def message(self, kind, origin, remote_class, count):
+        sites = self.call_sites.get((kind, origin), [])
+        if kind == 'relation':
+            source = 'relation %s' % origin
+            hint = ('load the related documents with one request using '
+                    '%s.mget(ids)' % remote_class.__name__)
+        else:
+            source = 'LazyDocument(%s)' % origin
+            hint = ('load the documents with one request using '
+                    '%s.mget(ids) and wrap the results with '
+                    'LazyDocument(doc)' % remote_class.__name__)
+        lines = ['N+1 query detected: %s single document loads of %s '
+                 'via %s' % (count, remote_class.__name__, source)]
+        for site in sites[:self.max_call_sites]:
+            lines.append('  at %s:%s in %s' % site)
+        lines.append('Hint: %s' % hint)
+        return '\n'.join(lines)
+
+    def report(self):
+        """Provide the recorded loads
+
+        Returns a list of dicts ordered by the number of loads.
+        """
+        rows = []
+        for (kind, origin), count in self.loads.items():
+            rows.append({
+                'kind': kind,
+                'origin': origin,
+                'count': count,
+                'call_sites': self.call_sites[(kind, origin)],
+            })
+        rows.sort(key=lambda row: (-row['count'], row['origin']))
+        return rows
+
+
+def call_site():
+    """Provide the innermost frame which is not part of lovely.esdb
+
+    The result is a tuple (filename, line number, function name).
+    """
+    for filename, lineno, name, line in reversed(traceback.extract_stack()):
+        path = os.path.abspath(filename)
+        if path.startswith(PACKAGE_DIR) and path.endswith('.py'):
+            continue
+        return (filename, lineno, name)
+    return None
+
+
+@contextmanager
+def detect_n_plus_one(threshold=5, strict=False):
+    """Count the single document loads in the current thread
+
+    Usage::
+
+        with detect_n_plus_one(threshold=10, strict=True) as detector:
+            handle_request()
+
+    Detectors can be nested, only the innermost detector is active.
+    """
+    detector = LoadDetector(threshold=threshold, strict=strict)
+    previous = getattr(_local, 'detector', None)
+    _local.detector = detector
+    try:
+        yield detector
+    finally:
+        _local.detector = previous
+
+
+def record_load(kind, origin, remote_class):
+    """Report a single document load to the active detector
+
+    Does nothing if no detector is active.
+    """
+    detector = getattr(_local, 'detector', None)
+    if detector is not None:
+        detector.record(kind, origin, remote_class)
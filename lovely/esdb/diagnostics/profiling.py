@@ -0,0 +1,199 @@
+import argparse
+import sys
+import threading
+from contextlib import contextmanager
+from functools import wraps
+from timeit import default_timer
+
+
+class Profiler(object):
+    """Measures the time spent in the (de)serialization stages of documents
+
+    The profiler wraps the methods of the profiled stages while it is enabled.
+    If it is disabled the original methods are restored which means there is
+    no overhead at all.
+
+    The times are aggregated per document class and stage. The times of a
+    stage include the times of the nested stages.
+    """
+
+    def __init__(self):
+        self.stats = {}
+        self._originals = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self._originals is not None
+
+    def enable(self):
+        if self.enabled:
+            return
+        self._originals = []
+        for owner, attr, stage, class_of in profiled_stages():
+            original = owner.__dict__[attr]
+            self._originals.append((owner, attr, original))
+            if isinstance(original, classmethod):
+                wrapped = classmethod(
+                    self._timed(original.__func__, stage, class_of))
+            else:
+                wrapped = self._timed(original, stage, class_of)
+            setattr(owner, attr, wrapped)
+
+    def disable(self):
+        if not self.enabled:
+            return
+        for owner, attr, original in self._originals:
+            setattr(owner, attr, original)
+        self._originals = None
+
+    def reset(self):
+        with self._lock:
+            self.stats = {}
+
+    def record(self, class_name, stage, duration):
+        key = (class_name, stage)
+        with self._lock:
+            stat = self.stats.get(key)
+            if stat is None:
+                self.stats[key] = [1, duration, duration]
+            else:
+                stat[0] += 1
+                stat[1] += duration
+                if duration > stat[2]:
+                    stat[2] = duration
+
+    def report(self):
+        """Provide the aggregated times
+
+        Returns a list of dicts ordered by the total time. All times are in
+        milliseconds.
+        """
+        rows = []
+        with self._lock:
+            for (class_name, stage), (calls, total, max_) in \
+                    self.stats.items():
+                rows.append({
+                    'class': class_name,
+                    'stage': stage,
+                    'calls': calls,
+                    'total': total * 1000,
+                    'mean': total * 1000 / calls,
+                    'max': max_ * 1000,
+                })
+        rows.sort(key=lambda row: (-row['total'], row['class'], row['stage']))
+        return rows
+
+    def table(self):
+        """Provide the report as text table
+        """
+        header = ('class', 'stage', 'calls', 'total ms', 'mean ms', 'max ms')
+        lines = [header]
+        for row in self.report():
+            lines.append((row['class'],
+                          row['stage'],
+                          '%d' % row['calls'],
+                          '%.3f' % row['total'],
+                          '%.4f' % row['mean'],
+                          '%.4f' % row['max']))
+        widths = [max(len(line[i]) for line in lines)
+                  for i in range(len(header))]
+        formatted = []
+        for line in lines:
+            cells = [line[0].ljust(widths[0]), line[1].ljust(widths[1])]
+            cells.extend(cell.rjust(width)
+                         for cell, width in zip(line[2:], widths[2:]))
+            formatted.append('  '.join(cells).rstrip())
+        formatted.insert(1, '-' * len(formatted[0]))
+        return '\n'.join(formatted)
+
+    def _timed(self, func, stage, class_of):
+        profiler = self
+
+        @wraps(func)
+        def timed(*args, **kwargs):
+            start = default_timer()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                profiler.record(class_of(args), stage,
+                                default_timer() - start)
+        return timed
+
+
+def _class_arg(args):
+    return args[0].__name__
+
+
+def _instance_class(args):
+    return args[0].__class__.__name__
+
+
+def _manager_class(args):
+    doc = args[0].doc
+    if doc is None:
+        return None
+    return doc.__class__.__name__
+
+
+def _doc_arg_class(args):
+    return args[1].__class__.__name__
+
+
+def profiled_stages():
+    """Provide the stages which are measured by the profiler
+
+    Each stage is a tuple (owner, attribute name, stage name, class_of).
+    class_of provides the name of the document class based on the arguments
+    of the profiled method.
+    """
+    from ..document.document import Document, DocumentValueManager
+    from ..properties.objectproperty import ObjectProperty
+    return [
+        (Document, 'from_raw_es_data', 'from_raw_es_data', _class_arg),
+        (Document, 'from_raw_es_hits', 'from_raw_es_hits', _class_arg),
+        (Document, '_apply_properties', '_apply_properties',
+         _instance_class),
+        (Document, '_apply_defaults', '_apply_defaults', _instance_class),
+        (DocumentValueManager, 'source_for_index', 'source_for_index',
+         _manager_class),
+        (ObjectProperty, '_transform_to_source', 'ObjectProperty.encode',
+         _doc_arg_class),
+        (ObjectProperty, '_apply', 'ObjectProperty.encode', _doc_arg_class),
+        (ObjectProperty, '_transform_from_source', 'ObjectProperty.decode',
+         _doc_arg_class),
+    ]
+
+
+# the global profiler
+PROFILER = Profiler()
+
+
+@contextmanager
+def profile(reset=True):
+    """Enable the profiler for a block of code
+    """
+    if reset:
+        PROFILER.reset()
+    PROFILER.enable()
+    try:
+        yield PROFILER
+    finally:
+        PROFILER.disable()
+
+
+def main(argv=None):
+    """Run a synthetic workload with enabled profiler and print the table
+    """
+    from .workload import run_workload
+    parser = argparse.ArgumentParser(
+        description='Profile the (de)serialization of documents')
+    parser.add_argument('-n', '--documents', type=int, default=1000,
+                        help='number of documents per iteration')
+    parser.add_argument('-i', '--iterations', type=int, default=5,
+                        help='number of iterations')
+    args = parser.parse_args(argv)
+    with profile() as profiler:
+        for i in range(args.iterations):
+            run_workload(args.documents)
+    sys.stdout.write(profiler.table() + '\n')
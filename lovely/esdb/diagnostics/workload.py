@@ -0,0 +1,79 @@
+from datetime import datetime
+
+from ..document import Document
+from ..properties import Property, ObjectProperty
+
+
+class WorkloadObject(object):
+    """The object stored in the object property of the workload document
+    """
+
+    def __init__(self, name=None, tags=None, created=None):
+        self.name = name
+        self.tags = tags or []
+        self.created = created
+
+
+class WorkloadDocument(Document):
+    """A document with simple, nested and object properties
+    """
+
+    INDEX = 'esdb_workload'
+
+    id = Property(primary_key=True)
+    title = Property(default=u'')
+    number = Property(default=0)
+    tags = Property(default=list)
+    info = Property(default=dict)
+    obj = ObjectProperty()
+
+
+def create_documents(count):
+    docs = []
+    for i in range(count):
+        docs.append(WorkloadDocument(
+            id=unicode(i),
+            title=u'document %s' % i,
+            number=i,
+            tags=[u'tag%s' % (i % 10), u'all'],
+            info={u'nested': {u'value': i, u'name': u'name %s' % i}},
+            obj=WorkloadObject(u'object %s' % i,
+                               [u'a', u'b'],
+                               datetime(2016, 10, 1, 12, 0, i % 60)),
+        ))
+    return docs
+
+
+def raw_hits(docs):
+    """Build raw elasticsearch hits for the documents
+    """
+    return [{'_id': doc.get_primary_key(set_after_read=True),
+             '_index': doc.INDEX,
+             '_type': doc.DOC_TYPE,
+             '_version': 1,
+             '_source': doc._get_store_index_body()}
+            for doc in docs]
+
+
+def read_documents(docs):
+    for doc in docs:
+        doc.id
+        doc.title
+        doc.number
+        doc.tags
+        doc.info
+        doc.obj
+
+
+def run_workload(count):
+    """Run the synthetic workload for `count` documents
+
+    The workload doesn't need elasticsearch. It creates documents, builds the
+    bodies to store them, hydrates documents from the bodies and reads all
+    properties.
+    """
+    docs = create_documents(count)
+    hits = raw_hits(docs)
+    loaded = [WorkloadDocument.from_raw_es_data(hit) for hit in hits]
+    read_documents(loaded)
+    return loaded
@@ -1,3 +1,9 @@
-from .document import DocumentMeta, Document  # noqa
+from .document import DocumentMeta, Document, VersionConflictError  # noqa
 from .lazy import LazyDocument, remove_proxy  # noqa
 from .bulk import Bulk  # noqa
+from .processor import BulkProcessor, BulkFuture  # noqa
+from .ingest import IngestPipeline  # noqa
+from .reindex import Reindex  # noqa
+from .byquery import ByQueryTask  # noqa
+from .sync import DocumentSync  # noqa
+from .replica import LocalReplica  # noqa
@@ -1,4 +1,10 @@
-from elasticsearch.helpers import bulk
+from itertools import izip
+
+from elasticsearch.exceptions import TransportError
+from elasticsearch.helpers import streaming_bulk, BulkIndexError
+
+from ..diagnostics.instrumentation import INSTRUMENTATION
+from .document import VersionConflictError
 
 
 class Bulk(object):
@@ -11,30 +17,44 @@ class Bulk(object):
     The Bulk class accepts various kwargs which will be passed to the bulk
     implementation of the elasticsearch client. For details see the docs
     http://elasticsearch-py.readthedocs.org/en/master/helpers.html
+
+    The versions of the documents are updated from the responses of the
+    bulk request.
+
+    The actions accept a `callback` which is called with the document, the
+    response item and the error of the action when the response of the
+    action is received. On success the error is None.
     """
 
     def __init__(self, es, **bulk_args):
         self.es = es
         self.bulk_args = bulk_args
         self.actions = []
+        self.doc_classes = set()
+        # the documents of the actions by (action, index, doc type, id)
+        self.documents = {}
 
-    def store(self, doc):
+    def store(self, doc, if_version=None, callback=None):
         """Store a document using the bulk
 
         Index the document.
         See also the comments for the Document.store about using the update
         API.
+
+        If `if_version` is set the document is only stored if its version in
+        elasticsearch matches. Conflicts raise a `VersionConflictError` on
+        flush.
         """
-        self._store_index(doc)
+        self._store_index(doc, if_version, callback)
 
-    def delete(self, doc):
+    def delete(self, doc, if_version=None, callback=None):
         """Delete a document using the bulk
         """
         self.actions.append(
-            self._get_action_base('delete', doc)
+            self._get_action_base('delete', doc, if_version, callback)
         )
 
-    def update_or_create(self, doc, properties=None):
+    def update_or_create(self, doc, properties=None, callback=None):
         """Update or create a document using the bulk
 
         Uses `update_or_create` to insert the document into the bulk.
@@ -43,28 +63,162 @@ class Bulk(object):
             self._get_action_base(
                 'update',
                 doc,
+                callback=callback,
                 _retry_on_conflict=5,
-                **doc._get_update_or_create_body(properties)
+                _source=doc._get_update_or_create_body(properties)
             )
         )
 
+    def store_rows(self, doc_class, rows, columns=None):
+        """Index rows of property values of `doc_class`
+
+        See `Document.bulk_rows`.
+        """
+        self.doc_classes.add(doc_class)
+        codec = doc_class._codec()
+        for doc_id, source in doc_class._rows_to_sources(rows, columns):
+            self.actions.append({
+                "_op_type": 'index',
+                "_index": doc_class.INDEX,
+                "_type": doc_class.DOC_TYPE,
+                "_id": doc_id,
+                "_source": codec.dumps(source),
+            })
+
+    def extend(self, other):
+        """Add the actions of another bulk to this bulk
+        """
+        self.actions.extend(other.actions)
+        self.doc_classes.update(other.doc_classes)
+        for key, entries in other.documents.iteritems():
+            self.documents.setdefault(key, []).extend(entries)
+
     def flush(self):
         """Execute the actions of the bulk
+
+        The actions are removed from the bulk also if the request fails.
         """
-        if self.actions:
-            res = bulk(self.es,
-                       self.actions,
-                       **self.bulk_args)
+        if not self.actions:
+            return None
+        try:
+            # the request is reported for the document class if all
+            # actions are for the same class
+            doc_class = None
+            if len(self.doc_classes) == 1:
+                doc_class, = self.doc_classes
+            indexes = set(action['_index'] for action in self.actions)
+            return INSTRUMENTATION.request('bulk',
+                                           doc_class,
+                                           ','.join(sorted(indexes)),
+                                           self.actions,
+                                           self._bulk,
+                                           self.es,
+                                           self.actions,
+                                           **self.bulk_args)
+        finally:
             self.actions = []
-            return res
+            self.doc_classes = set()
+            self.documents = {}
+
+    def _bulk(self, client, actions, stats_only=False, raise_on_error=True,
+              **kwargs):
+        """Execute the actions like `elasticsearch.helpers.bulk`
+
+        The versions of the documents are updated from the responses, also
+        if other actions of the request failed. Failed actions raise after
+        all responses are processed.
+        """
+        success = 0
+        failures = []
+        results = streaming_bulk(client, actions, raise_on_error=False,
+                                 **kwargs)
+        # the response items are in the order of the actions
+        for action, (ok, item) in izip(actions, results):
+            if ok:
+                self._update_document(action, item)
+                success += 1
+            else:
+                failures.append((action, item))
+        errors = [item for action, item in failures]
+        if not raise_on_error:
+            self._fail_documents(failures)
+        elif failures:
+            self._raise_conflicts(failures)
+            raise BulkIndexError(
+                u'%i document(s) failed to index.' % len(errors), errors)
+        return success, len(errors) if stats_only else errors
+
+    def _pop_document(self, action):
+        """Provide the document entry of an action
 
-    def _store_index(self, doc):
+        The entry is a tuple of the document, its version condition and the
+        callback.
+        """
+        entries = self.documents.get(_document_key(action))
+        if not entries:
+            return None, None, None
+        return entries.pop(0)
+
+    def _update_document(self, action, item):
+        doc, if_version, callback = self._pop_document(action)
+        info = item.values()[0]
+        if doc is not None:
+            doc._update_version(info)
+        if callback is not None:
+            callback(doc, info, None)
+
+    def _fail_documents(self, failures):
+        """Notify the callbacks of failed actions
+
+        `failures` are the (action, response item) tuples of the failed
+        actions. Returns the documents of conditional actions which failed
+        with a version conflict.
+        """
+        conflicts = []
+        for action, item in failures:
+            doc, if_version, callback = self._pop_document(action)
+            info = item.values()[0]
+            status = info.get('status')
+            conflict = if_version is not None and status == 409
+            if conflict:
+                conflicts.append(doc)
+            if callback is not None:
+                if conflict:
+                    error = VersionConflictError(
+                                'version_conflict_engine_exception',
+                                info,
+                                [doc])
+                else:
+                    error = TransportError(status, info.get('error'), info)
+                callback(doc, info, error)
+        return conflicts
+
+    def _raise_conflicts(self, failures):
+        """Notify the callbacks of failed actions
+
+        Raises a VersionConflictError for conflicts of conditional actions.
+        The info of the error is shaped like an error response of
+        elasticsearch, the failed items are in 'items'.
+        """
+        conflicts = self._fail_documents(failures)
+        if conflicts:
+            error = 'version_conflict_engine_exception'
+            reason = 'version conflicts of %s documents' % len(conflicts)
+            cause = {'type': error, 'reason': reason}
+            info = {'error': dict(cause, root_cause=[cause]),
+                    'status': 409,
+                    'items': [item for action, item in failures]}
+            raise VersionConflictError(error, info, conflicts)
+
+    def _store_index(self, doc, if_version=None, callback=None):
         """Index a new document
         """
         self.actions.append(
             self._get_action_base(
                 'index',
                 doc,
+                if_version,
+                callback,
                 _source=doc._get_store_index_body()
             )
         )
@@ -81,16 +235,40 @@ class Bulk(object):
                 'update',
                 doc,
                 _retry_on_conflict=5,
-                doc=changes
+                _source={'doc': changes}
             )
         )
 
-    def _get_action_base(self, action, document, **kwargs):
+    def _get_action_base(self, action, document, if_version=None,
+                         callback=None, **kwargs):
+        """Build a bulk action
+
+        The `_source` of the action is serialized with the codec of the
+        document class. With `if_version` the action is conditional on the
+        version of the document.
+        """
+        self.doc_classes.add(document.__class__)
+        if '_source' in kwargs:
+            kwargs['_source'] = document._codec().dumps(kwargs['_source'])
+        if if_version is not None:
+            kwargs['_version'] = if_version
+        doc_id = document.get_primary_key(set_after_read=True)
         res = {
             "_op_type": action,
             "_index": document.INDEX,
             "_type": document.DOC_TYPE,
-            "_id": document.get_primary_key(set_after_read=True),
+            "_id": doc_id,
         }
         res.update(kwargs)
+        self.documents.setdefault(_document_key(res), []).append(
+                                        (document, if_version, callback))
         return res
+
+
+def _document_key(action):
+    """The key of the document entries of an action
+    """
+    return (action.get('_op_type', 'index'),
+            action.get('_index'),
+            action.get('_type'),
+            unicode(action.get('_id')))
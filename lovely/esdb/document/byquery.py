@@ -0,0 +1,39 @@
+import time
+
+
+class ByQueryTask(object):
+    """A running update or delete by query task
+
+    Returned by `Document.update_where` and `Document.delete_where` if they
+    don't wait for the completion of the request.
+    """
+
+    def __init__(self, es, task_id):
+        self.es = es
+        self.task_id = task_id
+
+    def status(self):
+        """Provide the task information of elasticsearch
+        """
+        return self.es.tasks.get(task_id=self.task_id)
+
+    def done(self):
+        return bool(self.status().get('completed'))
+
+    def wait(self, poll_interval=1.0, timeout=None):
+        """Wait for the completion of the task
+
+        Returns the response of the completed request. Raises a RuntimeError
+        if the task is not completed after `timeout` seconds.
+        """
+        deadline = timeout is not None and time.time() + timeout
+        while True:
+            status = self.status()
+            if status.get('completed'):
+                return status.get('response', status['task']['status'])
+            if deadline and time.time() >= deadline:
+                raise RuntimeError('Task %s timed out' % self.task_id)
+            time.sleep(poll_interval)
+
+    def __repr__(self):
+        return '<ByQueryTask %s>' % self.task_id
@@ -0,0 +1,111 @@
+import array
+
+from ..properties import Property
+from ..properties.typed import IntegerProperty, FloatProperty
+
+
+NAN = float('nan')
+
+FORMATS = ('list', 'array', 'numpy')
+
+# the array typecodes of the numeric property types
+TYPECODES = (
+    (IntegerProperty, 'l'),
+    (FloatProperty, 'd'),
+)
+
+# the numpy dtypes of the array typecodes
+DTYPES = {'l': 'int64', 'd': 'float64'}
+
+
+def _typecode(prop):
+    for prop_class, typecode in TYPECODES:
+        if isinstance(prop, prop_class):
+            return typecode
+    return None
+
+
+def _numpy():
+    try:
+        import numpy
+    except ImportError:
+        raise ValueError('numpy is not available')
+    return numpy
+
+
+class ColumnBuilder(object):
+    """Collect the sources of raw hits into columns
+
+    The columns are a dict with a list of values for every python property
+    name of the document class and the list of ids under the key '_id'. No
+    documents are created, the values are taken from the `_source` of the
+    hits as they are. Only the properties of `doc_class` are exported,
+    properties of subclasses are ignored.
+
+    Missing values are filled with `null`.
+
+    With the format 'array' the columns of integer and float properties are
+    `array.array` instances, with the format 'numpy' all columns are numpy
+    arrays. Missing values of numeric arrays are NaN, an integer column with
+    missing values becomes a float column.
+    """
+
+    def __init__(self, doc_class, properties=None, format='list', null=None):
+        if format not in FORMATS:
+            raise ValueError('Unknown column format "%s"' % format)
+        if format == 'numpy':
+            _numpy()
+        members = dict(doc_class._members('_properties__', Property))
+        if properties is None:
+            properties = sorted(members)
+        for name in properties:
+            if name not in members:
+                raise ValueError('Unknown property "%s"' % name)
+        self.format = format
+        self.null = null
+        self.specs = [(name, members[name].name, _typecode(members[name]))
+                      for name in properties]
+        self.ids = []
+        self.values = [[] for spec in self.specs]
+
+    def source_filter(self, body):
+        """Restrict the source of the hits of a query to the columns
+        """
+        body = dict(body or {})
+        body.setdefault('_source', [key for (name, key, t) in self.specs])
+        return body
+
+    def add(self, hits):
+        """Add the values of raw hits to the columns
+        """
+        pairs = [(values, key)
+                 for (values, (name, key, t)) in zip(self.values, self.specs)]
+        append_id = self.ids.append
+        for hit in hits:
+            append_id(hit['_id'])
+            source = hit.get('_source') or {}
+            for values, key in pairs:
+                values.append(source.get(key))
+
+    def result(self):
+        """Provide the columns
+        """
+        columns = {'_id': self._column(self.ids, None)}
+        for (name, key, typecode), values in zip(self.specs, self.values):
+            columns[name] = self._column(values, typecode)
+        return columns
+
+    def _column(self, values, typecode):
+        if typecode is not None and self.format != 'list':
+            if typecode == 'd' or None in values:
+                typecode = 'd'
+                values = [NAN if v is None else v for v in values]
+            if self.format == 'array':
+                return array.array(typecode, values)
+            return _numpy().array(values, dtype=DTYPES[typecode])
+        if self.null is not None:
+            null = self.null
+            values = [null if v is None else v for v in values]
+        if self.format == 'numpy':
+            return _numpy().array(values, dtype=object)
+        return values
@@ -1,14 +1,25 @@
 import copy
 import inspect
-import json
 import jsonpickle
 
 from collections import defaultdict
 
 import elasticsearch.exceptions
 
+from ..codec import get_codec
+from ..diagnostics.instrumentation import INSTRUMENTATION
+from ..mapping import INTERNAL_FIELD_MAPPING, internal_fields_template, merge
 from ..properties import Property
 from ..properties.relation import RelationBase
+from .byquery import ByQueryTask
+from .columns import ColumnBuilder
+from .incremental import (
+    UPDATE_SCRIPT,
+    UPDATE_SCRIPT_LANG,
+    diff_source,
+    update_params,
+)
+from .scan import slice_query, sliced_pages
 
 
 DOCUMENTREGISTRY = defaultdict(dict)
@@ -45,9 +56,29 @@ class DocumentMeta(type):
                             "Multiple primary key properties."
                         )
                     cls._primary_key_name = name
+            elif isinstance(prop, RelationBase) and prop.name is None:
+                prop.name = name
+        # documents overriding the initialisation must be hydrated through
+        # `init`
+        if (any(isinstance(b, DocumentMeta) for b in bases)
+            and any(m in dct for m in ('init', '_prepare_values',
+                                       '_update_meta'))):
+            cls._custom_init = True
         super(DocumentMeta, cls).__init__(name, bases, dct)
 
 
+class VersionConflictError(elasticsearch.exceptions.ConflictError):
+    """Raised if a conditional write fails
+
+    The version of the documents in elasticsearch doesn't match the expected
+    version. `documents` contains the conflicting documents.
+    """
+
+    def __init__(self, error, info, documents):
+        super(VersionConflictError, self).__init__(409, error, info)
+        self.documents = documents
+
+
 class Document(object):
     """Representation of an elasticsearch document as python object
 
@@ -64,12 +95,22 @@ class Document(object):
 
     WITH_INHERITANCE = False
 
+    # the JSON codec for the document, the default codec is used if None
+    CODEC = None
+
+    # an incremental store falls back to a full index if the update params
+    # are larger than this fraction of the full source
+    INCREMENTAL_THRESHOLD = 0.5
+
     RESERVED_PROPERTIES = set([])
 
-    _values = None
-    _meta = None
+    # `_values` and `_meta` are always set, the instance `__dict__` is only
+    # allocated if other attributes are set on a document
+    __slots__ = ('_values', '_meta', '__dict__', '__weakref__')
+
     _update_properties = None
     _primary_key_name = None
+    _custom_init = False
 
     def __init__(self, **kwargs):
         if self.INDEX is None:
@@ -88,23 +129,40 @@ class Document(object):
         self._prepare_values(**kwargs)
         self._update_meta()
 
-    def store(self, **index_update_kwargs):
+    def store(self, mode='index', if_version=None, **index_update_kwargs):
         """Store the document
 
-        Here it would be possible to optimze by using an update script.
+        With the default mode 'index' the full document is indexed.
 
-        Currently we always do a full index because the update API doesn't
-        allow to remove properties for dictionaries.
-        """
-        return self._store_index(**index_update_kwargs)
+        With mode 'incremental' only the changes against the loaded source
+        are sent using an update script which also removes keys. New
+        documents and documents with large changes are fully indexed.
+        Returns None if nothing has changed.
 
-    def delete(self, **delete_args):
+        If `if_version` is set the document is only stored if its version in
+        elasticsearch matches, otherwise a `VersionConflictError` is raised.
+        The version of the document is updated from the response.
+        """
+        if mode == 'index':
+            return self._store_index(if_version=if_version,
+                                     **index_update_kwargs)
+        if mode == 'incremental':
+            return self._store_incremental(if_version=if_version,
+                                           **index_update_kwargs)
+        raise ValueError('Unknown store mode "%s"' % mode)
+
+    def delete(self, if_version=None, **delete_args):
         """Delete an object from elasticsearch
+
+        If `if_version` is set the document is only deleted if its version in
+        elasticsearch matches, otherwise a `VersionConflictError` is raised.
         """
         if self.is_new():
             # document has never been stored
             return
-        return self._get_es().delete(
+        return self._write_request(
+                    'delete',
+                    if_version=if_version,
                     index=self._meta['_index'],
                     doc_type=self._meta['_type'],
                     id=self.get_primary_key(),
@@ -124,7 +182,8 @@ class Document(object):
         """
         body = self._get_update_or_create_body(properties)
         doc_id = self.get_primary_key()
-        return self._get_es().update(
+        return self._write_request(
+                    'update',
                     index=self._meta['_index'],
                     doc_type=self._meta['_type'],
                     id=doc_id,
@@ -182,17 +241,21 @@ class Document(object):
         for name, prop in self._properties():
             if self._values.exists(prop.name):
                 res[name] = self._values.get(prop.name)
-        return json.loads(jsonpickle.encode(res, unpicklable=False))
+        codec = self._codec()
+        return codec.loads(jsonpickle.encode(res,
+                                             unpicklable=False,
+                                             backend=codec))
 
     @classmethod
     def get(cls, id):
         """Get an object with a specific id from elasticsearch
         """
         try:
-            res = cls._get_es().get(index=cls.INDEX,
-                                    doc_type=cls.DOC_TYPE,
-                                    id=id,
-                                   )
+            res = cls._es_request('get',
+                                  index=cls.INDEX,
+                                  doc_type=cls.DOC_TYPE,
+                                  id=id,
+                                 )
         except elasticsearch.exceptions.ElasticsearchException:
             return None
         return cls.from_raw_es_data(res)
@@ -203,10 +266,11 @@ class Document(object):
         """
         if not ids:
             return []
-        docs = cls._get_es().mget(index=cls.INDEX,
-                                  doc_type=cls.DOC_TYPE,
-                                  body={'ids': ids},
-                                 ).get('docs')
+        docs = cls._es_request('mget',
+                               index=cls.INDEX,
+                               doc_type=cls.DOC_TYPE,
+                               body={'ids': ids},
+                              ).get('docs')
         result = []
         for doc in docs:
             if 'error' in doc or not doc.get('found', False):
@@ -242,24 +306,200 @@ class Document(object):
         Returns the ES search result. If resolve_hits is set to true the hits
         are converted to Documents.
         """
-        docs = cls._get_es().search(index=cls.INDEX,
-                                    doc_type=cls.DOC_TYPE,
-                                    body=body
-                                   )
+        docs = cls._es_request('search',
+                               index=cls.INDEX,
+                               doc_type=cls.DOC_TYPE,
+                               body=body
+                              )
         if resolve_hits:
-            data = []
-            for d in docs['hits']['hits']:
-                data.append(cls.from_raw_es_data(d))
-            docs['hits']['hits'] = data
+            docs['hits']['hits'] = cls.from_raw_es_hits(docs['hits']['hits'])
         return docs
 
+    @classmethod
+    def search_columns(cls, body, properties=None, format='list', null=None):
+        """Retrieve the hits of a search query as columns
+
+        The hits are not converted to documents, see `ColumnBuilder` for the
+        arguments and the result. Only the sources of the properties in
+        `properties` are requested if the body doesn't filter the source.
+        """
+        builder = ColumnBuilder(cls, properties, format, null)
+        res = cls._es_request('search',
+                              index=cls.INDEX,
+                              doc_type=cls.DOC_TYPE,
+                              body=builder.source_filter(body),
+                             )
+        builder.add(res['hits']['hits'])
+        return builder.result()
+
+    @classmethod
+    def scan(cls, query=None, resolve_hits=True, **scan_args):
+        """Iterate over all hits of a query using the scroll API
+
+        If resolve_hits is set to true the hits are converted to Documents.
+        See `_scan_pages` for the scan arguments.
+        """
+        for hits in cls._scan_pages(query, **scan_args):
+            if resolve_hits:
+                hits = cls.from_raw_es_hits(hits)
+            for hit in hits:
+                yield hit
+
+    @classmethod
+    def scan_columns(cls, query=None, properties=None, format='list',
+                     null=None, **scan_args):
+        """Retrieve all hits of a query as columns using the scroll API
+
+        See `search_columns` and `_scan_pages`.
+        """
+        builder = ColumnBuilder(cls, properties, format, null)
+        for hits in cls._scan_pages(builder.source_filter(query),
+                                    **scan_args):
+            builder.add(hits)
+        return builder.result()
+
+    @classmethod
+    def _scan_pages(cls, query=None, size=500, scroll='5m', slices=1,
+                    ordered=False, prefetch=2):
+        """Provide the pages of raw hits of a scroll search
+
+        The hits are fetched in pages of `size` hits. With more than one
+        slice the pages are read by parallel sliced scrolls, see
+        `scan.sliced_pages` for `ordered` and `prefetch`.
+        """
+        if slices <= 1:
+            return cls._scroll_pages(query, size, scroll)
+
+        def pages(slice_id):
+            return cls._scroll_pages(slice_query(query, slice_id, slices),
+                                     size,
+                                     scroll)
+        return sliced_pages(pages, slices, ordered, prefetch)
+
+    @classmethod
+    def _scroll_pages(cls, query=None, size=500, scroll='5m'):
+        """Provide the pages of raw hits of a scroll
+
+        The scroll is cleared when the iteration stops.
+        """
+        body = dict(query or {})
+        body.setdefault('sort', ['_doc'])
+        res = cls._es_request('search',
+                              index=cls.INDEX,
+                              doc_type=cls.DOC_TYPE,
+                              body=body,
+                              scroll=scroll,
+                              size=size,
+                             )
+        scroll_id = res.get('_scroll_id')
+        try:
+            while res['hits']['hits']:
+                yield res['hits']['hits']
+                res = cls._es_request('scroll',
+                                      scroll_id=scroll_id,
+                                      scroll=scroll)
+                scroll_id = res.get('_scroll_id', scroll_id)
+        finally:
+            if scroll_id is not None:
+                try:
+                    cls._es_request('clear_scroll', scroll_id=scroll_id)
+                except elasticsearch.exceptions.ElasticsearchException:
+                    pass
+
+    @classmethod
+    def term_query(cls, **values):
+        """Build a query matching the documents with the property values
+
+        The python property names are translated to the query names of the
+        properties. If a value is a list type a terms query is used.
+        """
+        properties = dict(cls._members('_properties__', Property))
+        filters = []
+        for name, value in sorted(values.iteritems()):
+            if name not in properties:
+                raise ValueError('Unknown property "%s"' % name)
+            query_type = isinstance(value, (list, tuple)) and 'terms' or 'term'
+            filters.append(
+                {query_type: {properties[name].get_query_name(): value}})
+        return {'bool': {'filter': filters}}
+
+    @classmethod
+    def update_where(cls, query=None, set=None, wait=True,
+                     requests_per_second=None, **update_args):
+        """Set property values of all documents matching a query
+
+        The documents are updated by elasticsearch with an update by query
+        request and a parameterized script, no sources are transferred.
+        `set` maps python property names to the new values, the values are
+        converted like assigned values.
+
+        If `wait` is false a `ByQueryTask` is returned to track the request,
+        otherwise the response of elasticsearch. `requests_per_second`
+        throttles the request.
+        """
+        sets = [[[name], value] for (name, value)
+                in sorted(cls._source_values(set or {}).iteritems())]
+        body = {'query': query or {'match_all': {}},
+                'script': {'inline': UPDATE_SCRIPT,
+                           'lang': UPDATE_SCRIPT_LANG,
+                           'params': update_params(sets, [])}}
+        return cls._by_query('update_by_query', body, wait,
+                             requests_per_second, **update_args)
+
+    @classmethod
+    def delete_where(cls, query=None, wait=True, requests_per_second=None,
+                     **delete_args):
+        """Delete all documents matching a query
+
+        See `update_where`.
+        """
+        body = {'query': query or {'match_all': {}}}
+        return cls._by_query('delete_by_query', body, wait,
+                             requests_per_second, **delete_args)
+
+    @classmethod
+    def _by_query(cls, operation, body, wait, requests_per_second,
+                  **kwargs):
+        if requests_per_second is not None:
+            kwargs['requests_per_second'] = requests_per_second
+        res = cls._es_request(operation,
+                              index=cls.INDEX,
+                              doc_type=cls.DOC_TYPE,
+                              body=body,
+                              wait_for_completion=wait,
+                              **kwargs)
+        if not wait:
+            return ByQueryTask(cls._get_es(), res['task'])
+        return res
+
+    @classmethod
+    def _source_values(cls, values):
+        """Convert property values into source values
+
+        `values` maps python property names to values. Returns a dict
+        with the source values by source name.
+        """
+        properties = dict(cls._members('_properties__', Property))
+        doc = cls.__new__(cls)
+        doc._meta = {}
+        doc._values = DocumentValueManager(doc)
+        source = {}
+        for name, value in values.iteritems():
+            prop = properties.get(name)
+            if prop is None:
+                raise ValueError('Unknown property "%s"' % name)
+            value = prop._setter(doc, value)
+            source[prop.name] = prop._transform_to_source(doc, value)
+        return source
+
     @classmethod
     def count(cls, body=None, **count_args):
         """Get the count of data stored in elasticsearch.
 
         It's possible to provide a query with the ``body`` argument.
         """
-        res = cls._get_es().count(
+        res = cls._es_request(
+            'count',
             index=cls.INDEX,
             doc_type=cls.DOC_TYPE,
             body=body,
@@ -271,7 +511,175 @@ class Document(object):
     def refresh(cls, **refresh_args):
         """Refresh the index for this document
         """
-        return cls._get_es().indices.refresh(index=cls.INDEX, **refresh_args)
+        return INSTRUMENTATION.request('refresh',
+                                       cls,
+                                       cls.INDEX,
+                                       None,
+                                       cls._get_es().indices.refresh,
+                                       index=cls.INDEX,
+                                       **refresh_args)
+
+    @classmethod
+    def get_mapping(cls):
+        """Build the elasticsearch mapping for the document type
+
+        The mapping is generated from the properties and relations of all
+        document classes registered for the index and document type.
+        Internal fields with a name ending with `__` are stored but not
+        indexed.
+        """
+        properties = {}
+        doc_classes = DOCUMENTREGISTRY[cls.INDEX_TYPE_NAME].values()
+        for doc_class in sorted(doc_classes, key=lambda c: c.__name__):
+            for name, prop in doc_class._members('_properties__', Property):
+                mapping = prop.get_mapping()
+                if mapping is not None:
+                    merge(properties.setdefault(prop.name, {}), mapping)
+            for name, relation in doc_class._members('_relations__',
+                                                     RelationBase):
+                prop_name, mapping = relation.get_mapping(doc_class)
+                # an explicit mapping of the property wins
+                properties[prop_name] = merge(mapping,
+                                              properties.get(prop_name, {}))
+            if doc_class.WITH_INHERITANCE:
+                properties['db_class__'] = merge({}, INTERNAL_FIELD_MAPPING)
+        return {
+            'dynamic_templates': [internal_fields_template()],
+            'properties': properties,
+        }
+
+    @classmethod
+    def put_mapping(cls, **mapping_args):
+        """Put the generated mapping for the document type
+
+        Putting the same mapping again doesn't change the index.
+        """
+        body = cls.get_mapping()
+        return INSTRUMENTATION.request('put_mapping',
+                                       cls,
+                                       cls.INDEX,
+                                       body,
+                                       cls._get_es().indices.put_mapping,
+                                       doc_type=cls.DOC_TYPE,
+                                       body=body,
+                                       index=cls.INDEX,
+                                       **mapping_args)
+
+    @classmethod
+    def create_index(cls, settings=None):
+        """Create the index of the document with the generated mapping
+
+        If the index already exists the mapping is put to the existing index.
+        Returns True if the index was created.
+        """
+        es = cls._get_es()
+        exists = INSTRUMENTATION.request('index_exists',
+                                         cls,
+                                         cls.INDEX,
+                                         None,
+                                         es.indices.exists,
+                                         index=cls.INDEX)
+        if not exists:
+            body = {'mappings': {cls.DOC_TYPE: cls.get_mapping()}}
+            if settings is not None:
+                body['settings'] = settings
+            try:
+                INSTRUMENTATION.request('create_index',
+                                        cls,
+                                        cls.INDEX,
+                                        body,
+                                        es.indices.create,
+                                        index=cls.INDEX,
+                                        body=body)
+                return True
+            except elasticsearch.exceptions.RequestError as e:
+                if 'already_exists' not in str(e.error):
+                    raise
+        cls.put_mapping()
+        return False
+
+    @classmethod
+    def bulk_rows(cls, rows, bulk=None, columns=None):
+        """Index rows of property values without creating documents
+
+        A row is a dict with the values by python property name or a tuple
+        with the values of the property names in `columns`. The sources are
+        identical to the sources of documents created with the values.
+
+        The index actions are added to `bulk` and the bulk is returned. If
+        no bulk is given a bulk is created and flushed, the result of the
+        flush is returned.
+        """
+        if bulk is None:
+            from .bulk import Bulk
+            bulk = Bulk(cls._get_es())
+            bulk.store_rows(cls, rows, columns)
+            return bulk.flush()
+        bulk.store_rows(cls, rows, columns)
+        return bulk
+
+    @classmethod
+    def export(cls, path, query=None, **export_args):
+        """Write the documents to a gzip compressed NDJSON snapshot file
+
+        All documents are exported if no query is given. See
+        `snapshot.export_snapshot` for the arguments and the result.
+        """
+        from .snapshot import export_snapshot
+        return export_snapshot(cls, path, query, **export_args)
+
+    @classmethod
+    def import_(cls, path, offset=0, **import_args):
+        """Index the documents of a snapshot file written by `export`
+
+        See `snapshot.import_snapshot` for the arguments and the result.
+        """
+        from .snapshot import import_snapshot
+        return import_snapshot(cls, path, offset=offset, **import_args)
+
+    @classmethod
+    def _rows_to_sources(cls, rows, columns=None):
+        """Provide the (id, source) tuples of rows
+
+        The properties are applied to the rows directly. Only one document
+        is created to be passed to setters and properties, it provides the
+        values of the current row. Rows containing relations and classes
+        overriding the initialisation use a document per row.
+        """
+        properties = cls._members('_properties__', Property)
+        relation_names = set(name for (name, relation)
+                             in cls._members('_relations__', RelationBase))
+        values = None
+        if not cls._custom_init:
+            doc = cls.__new__(cls)
+            doc._meta = {}
+            doc._values = values = DocumentValueManager(doc)
+        for row in rows:
+            if columns is not None:
+                row = dict(zip(columns, row))
+            if values is None or relation_names.intersection(row):
+                full = cls(**row)
+                source = full._get_store_index_body()
+                yield full.get_primary_key(), source
+                continue
+            # the values of the row are set like in `_prepare_values` so
+            # setters reading other properties see the values of this row
+            values._source = EMPTY_STORE
+            values._changed = changed = {}
+            values._default = EMPTY_STORE
+            values._property_cache = EMPTY_STORE
+            for name, prop in properties:
+                if name in row:
+                    value = prop._setter(doc, row[name])
+                    changed[prop.name] = prop._transform_to_source(doc, value)
+            for name, prop in properties:
+                if not values.exists(prop.name):
+                    prop._set_default(doc)
+            source = dict(values._default)
+            source.update(changed)
+            if cls.WITH_INHERITANCE:
+                source['db_class__'] = cls.__name__
+            yield doc.primary_key, source
 
     @classmethod
     def from_raw_es_data(cls, raw):
@@ -282,10 +690,50 @@ class Document(object):
         """
         class_name = raw.get('_source', {}).get('db_class__')
         klass = DOCUMENTREGISTRY[cls.INDEX_TYPE_NAME].get(class_name, cls)
-        obj = klass.__new__(klass)
-        obj.init()
-        obj._values.source = raw['_source']
-        obj._update_meta(raw['_id'], raw.get('_version'))
+        return klass._hydrate(raw)
+
+    @classmethod
+    def from_raw_es_hits(cls, hits):
+        """Setup documents from a list of raw elasticsearch hits
+
+        This is the bulk version of `from_raw_es_data`. The document class is
+        looked up once per `db_class__` value and not for every hit.
+        """
+        registry = DOCUMENTREGISTRY[cls.INDEX_TYPE_NAME]
+        hydrators = {}
+        result = []
+        append = result.append
+        for raw in hits:
+            class_name = raw['_source'].get('db_class__')
+            hydrate = hydrators.get(class_name)
+            if hydrate is None:
+                hydrate = hydrators[class_name] = registry.get(class_name,
+                                                               cls)._hydrate
+            append(hydrate(raw))
+        return result
+
+    @classmethod
+    def _hydrate(cls, raw):
+        """Create an instance of this class from raw elasticsearch data
+
+        There are no property values to prepare for a hydrated document so
+        the property walk of `init` is skipped unless the class overrides
+        `init`.
+        """
+        obj = cls.__new__(cls)
+        if cls._custom_init:
+            obj.init()
+            obj._values.source = raw['_source']
+            obj._update_meta(raw['_id'], raw.get('_version'))
+            return obj
+        values = obj._values = DocumentValueManager(obj)
+        values.source = raw['_source']
+        obj._meta = {
+            '_id': raw['_id'],
+            '_version': raw.get('_version'),
+            '_index': cls.INDEX,
+            '_type': cls.DOC_TYPE,
+        }
         return obj
 
     @staticmethod
@@ -300,7 +748,8 @@ class Document(object):
         """
         body = self._get_store_index_body()
         doc_id = self.get_primary_key()
-        return self._get_es().index(
+        return self._write_request(
+                    'index',
                     index=self._meta['_index'],
                     doc_type=self._meta['_type'],
                     id=doc_id,
@@ -321,6 +770,58 @@ class Document(object):
         self.get_primary_key(set_after_read=True)
         return self._values.source_for_index(update_source=True)
 
+    def _store_incremental(self, **update_kwargs):
+        """Send the changes of the document with an update script
+        """
+        if self.is_new():
+            return self._store_index(**update_kwargs)
+        body = self._get_store_incremental_body()
+        if body is None:
+            # no changes found
+            return None
+        operation = 'update'
+        if isinstance(body, basestring):
+            # the changes are too large, index the document
+            operation = 'index'
+            update_kwargs.pop('retry_on_conflict', None)
+        return self._write_request(
+                    operation,
+                    index=self._meta['_index'],
+                    doc_type=self._meta['_type'],
+                    id=self.get_primary_key(),
+                    body=body,
+                    **update_kwargs
+                )
+
+    def _get_store_incremental_body(self):
+        """Create the body of an incremental store
+
+        Provides the update body with the script applying the changes, the
+        serialized source if the changes are too large or None if there are
+        no changes.
+        """
+        old = self._values._source
+        removed = self._values._removed
+        self._apply_properties()
+        self._apply_defaults()
+        self.get_primary_key(set_after_read=True)
+        source = self._values.source_for_index(update_source=True)
+        sets, removes = diff_source(old, source, removed)
+        if not (sets or removes):
+            return None
+        params = update_params(sets, removes)
+        codec = self._codec()
+        body = codec.dumps(source)
+        if len(codec.dumps(params)) > self.INCREMENTAL_THRESHOLD * len(body):
+            return body
+        return {
+            'script': {
+                'inline': UPDATE_SCRIPT,
+                'lang': UPDATE_SCRIPT_LANG,
+                'params': params,
+            }
+        }
+
     def _store_update(self, **update_kwargs):
         """Update the document if there are changes
         """
@@ -332,7 +833,8 @@ class Document(object):
             "doc": doc
         }
         doc_id = self.get_primary_key()
-        return self._get_es().update(
+        return self._write_request(
+                    'update',
                     index=self._meta['_index'],
                     doc_type=self._meta['_type'],
                     id=doc_id,
@@ -408,14 +910,14 @@ class Document(object):
     def _apply_defaults(self):
         """Apply default values for all missing properties
         """
-        source = self._values.source_for_index()
+        source = self._values.source_for_index(update_source=False)
         for (name, prop) in self._properties():
             if prop.name not in source:
                 # reading the property will set the default
                 getattr(self, name)
 
     def _update_meta(self, _id=None, _version=None, **kwargs):
-        if self._meta is None:
+        if getattr(self, '_meta', None) is None:
             self._meta = {}
         if not self._meta.get('_id') or _id:
             self._meta['_id'] = _id
@@ -425,22 +927,89 @@ class Document(object):
         self._meta.update(kwargs)
 
     def _properties(self):
-        """yield the properties of the document
+        """provide the properties of the document
         """
-        def isProperty(obj):
-            return isinstance(obj, Property)
-        for (name, prop) in inspect.getmembers(self.__class__, isProperty):
-            if name not in self.RESERVED_PROPERTIES:
-                yield (name, prop)
+        return self._members('_properties__', Property)
 
     def _get_relation_properties(self):
-        """yield the relations of the document
+        """provide the relations of the document
+        """
+        return self._members('_relations__', RelationBase)
+
+    @classmethod
+    def _members(cls, key, member_class):
+        """provide the (name, member) tuples of the class members which are
+        instances of `member_class`
+
+        The list is computed once per class and stored in the class under
+        `key`.
         """
-        def isRelation(obj):
-            return isinstance(obj, RelationBase)
-        for (name, prop) in inspect.getmembers(self.__class__, isRelation):
-            if name not in self.RESERVED_PROPERTIES:
-                yield (name, prop)
+        members = cls.__dict__.get(key)
+        if members is None:
+            def isMember(obj):
+                return isinstance(obj, member_class)
+            members = [(name, member)
+                       for (name, member) in inspect.getmembers(cls, isMember)
+                       if name not in cls.RESERVED_PROPERTIES]
+            setattr(cls, key, members)
+        return members
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state['_values'] = self._values
+        state['_meta'] = self._meta
+        return state
+
+    def __setstate__(self, state):
+        for name, value in state.iteritems():
+            object.__setattr__(self, name, value)
+
+    @classmethod
+    def _codec(cls):
+        """Provide the JSON codec of the document class
+        """
+        return get_codec(cls.CODEC)
+
+    @classmethod
+    def _es_request(cls, operation, **kwargs):
+        """Send a request using the method `operation` of the ES client
+
+        The body is serialized with the codec of the document class. The
+        request is measured by the instrumentation.
+        """
+        body = kwargs.get('body')
+        if body is not None and not isinstance(body, basestring):
+            kwargs['body'] = cls._codec().dumps(body)
+        return INSTRUMENTATION.request(operation,
+                                       cls,
+                                       kwargs.get('index'),
+                                       kwargs.get('body'),
+                                       getattr(cls._get_es(), operation),
+                                       **kwargs)
+
+    def _write_request(self, operation, if_version=None, **kwargs):
+        """Send a write request for the document
+
+        The version of the response is stored in the metadata. With
+        `if_version` the write is conditional on the version in
+        elasticsearch, a conflict raises a `VersionConflictError`.
+        """
+        if if_version is not None:
+            kwargs['version'] = if_version
+        try:
+            res = self._es_request(operation, **kwargs)
+        except elasticsearch.exceptions.ConflictError as e:
+            if if_version is None:
+                raise
+            raise VersionConflictError(e.error, e.info, [self])
+        self._update_version(res)
+        return res
+
+    def _update_version(self, res):
+        """Update the version in the metadata from a write response
+        """
+        if res and '_version' in res:
+            self._meta['_version'] = res['_version']
 
     @classmethod
     def _get_es(cls):
@@ -449,32 +1018,102 @@ class Document(object):
         return cls.ES
 
 
+class EmptyStore(dict):
+    """A read only empty dict
+
+    One instance is shared by all value managers as long as nothing was
+    written to a store. Copies of the store are normal dicts.
+    """
+
+    __slots__ = ()
+
+    def _read_only(self, *args, **kwargs):
+        raise TypeError('EmptyStore is read only')
+
+    __setitem__ = __delitem__ = _read_only
+    clear = pop = popitem = setdefault = update = _read_only
+
+    def copy(self):
+        return {}
+
+    def __copy__(self):
+        return {}
+
+    def __deepcopy__(self, memo):
+        return {}
+
+    def __reduce__(self):
+        return (dict, ())
+
+
+EMPTY_STORE = EmptyStore()
+
+
+def _store(name):
+    """A store of the value manager which is allocated when it is accessed
+    """
+    slot = '_' + name
+
+    def get(self):
+        store = getattr(self, slot)
+        if store is EMPTY_STORE:
+            store = {}
+            setattr(self, slot, store)
+        return store
+
+    def set(self, value):
+        setattr(self, slot, value)
+    return property(get, set)
+
+
 class DocumentValueManager(object):
     """Manages the stores for the property values
 
     A manager instance is used by the properties of a document to manage the
     values.
+
+    The stores share `EMPTY_STORE` until they are accessed so hydrated
+    documents which are only read don't allocate the change and default
+    stores. Properties must use the underscored stores to only read from a
+    store.
     """
 
+    __slots__ = ('doc',
+                 '_source',
+                 '_changed',
+                 '_default',
+                 '_property_cache',
+                 '_removed',
+                )
+
+    source = _store('source')
+    changed = _store('changed')
+    default = _store('default')
+    property_cache = _store('property_cache')
+    # the names deleted from the source since it was stored or loaded
+    removed = _store('removed')
+
     def __init__(self, doc):
         self.doc = doc
-        self.source = {}
-        self.changed = {}
-        self.default = {}
-        self.property_cache = {}
+        self._source = EMPTY_STORE
+        self._changed = EMPTY_STORE
+        self._default = EMPTY_STORE
+        self._property_cache = EMPTY_STORE
+        self._removed = EMPTY_STORE
 
     def source_for_index(self, update_source=True):
         """Build the source which contains all properties for indexing
         """
-        source = copy.deepcopy(self.default)
-        source.update(copy.deepcopy(self.source))
-        source.update(copy.deepcopy(self.changed))
+        source = copy.deepcopy(self._default)
+        source.update(copy.deepcopy(self._source))
+        source.update(copy.deepcopy(self._changed))
         if self.doc and self.doc.WITH_INHERITANCE:
             source['db_class__'] = self.doc.__class__.__name__
         if update_source:
-            self.source = copy.deepcopy(source)
-            self.changed = {}
-            self.default = {}
+            self._source = copy.deepcopy(source)
+            self._changed = EMPTY_STORE
+            self._default = EMPTY_STORE
+            self._removed = EMPTY_STORE
         return source
 
     def source_for_update(self, update_source=True):
@@ -482,12 +1121,13 @@ class DocumentValueManager(object):
 
         Will only contain changed properties and new defaults.
         """
-        source = copy.deepcopy(self.default)
-        source.update(copy.deepcopy(self.changed))
+        source = copy.deepcopy(self._default)
+        source.update(copy.deepcopy(self._changed))
         if update_source:
             self.source.update(copy.deepcopy(source))
-            self.changed = {}
-            self.default = {}
+            self._changed = EMPTY_STORE
+            self._default = EMPTY_STORE
+            self._removed = EMPTY_STORE
         return source
 
     def get(self, name):
@@ -496,33 +1136,49 @@ class DocumentValueManager(object):
         name must be the name which is used in the database not in the python
         class.
         """
-        if name in self.property_cache:
-            return self.property_cache[name]
-        if name in self.changed:
-            return self.changed[name]
-        if name in self.source:
-            return self.source[name]
-        return self.default[name]
+        if name in self._property_cache:
+            return self._property_cache[name]
+        if name in self._changed:
+            return self._changed[name]
+        if name in self._source:
+            return self._source[name]
+        return self._default[name]
 
     def exists(self, name):
         """Tests if the value for a property is defined
         """
-        return (name in self.property_cache
-                or name in self.changed
-                or name in self.source
-                or name in self.default)
+        return (name in self._property_cache
+                or name in self._changed
+                or name in self._source
+                or name in self._default)
 
     def delete(self, name):
         """Delete the value from all stores
         """
-        if name in self.property_cache:
-            del self.property_cache[name]
-        if name in self.changed:
-            del self.changed[name]
-        if name in self.source:
-            del self.source[name]
-        if name in self.default:
-            del self.default[name]
+        if name in self._property_cache:
+            del self._property_cache[name]
+        if name in self._changed:
+            del self._changed[name]
+        if name in self._source:
+            del self._source[name]
+            self.removed[name] = True
+        if name in self._default:
+            del self._default[name]
+
+    def __getstate__(self):
+        # the shared empty store is not part of the state, otherwise all
+        # empty stores would become the same dict in a copy
+        state = {}
+        for name in self.__slots__:
+            value = getattr(self, name)
+            if value is not EMPTY_STORE:
+                state[name] = value
+        return state
+
+    def __setstate__(self, state):
+        self.__init__(state.get('doc'))
+        for name, value in state.iteritems():
+            setattr(self, name, value)
 
     def raw_source(self, stripped=True):
         """Provides the current known source
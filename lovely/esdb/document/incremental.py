@@ -0,0 +1,79 @@
+# The update script of incremental stores. The params contain the paths of
+# the removed keys in `removes` and [path, value] pairs in `sets`. Missing
+# objects on the path of a set are created.
+UPDATE_SCRIPT = (
+    "for (path in removes) {"
+    " def obj = ctx._source;"
+    " for (int i = 0; i < path.size() - 1 && obj instanceof Map; i++) {"
+    " obj = obj[path[i]] };"
+    " if (obj instanceof Map) { obj.remove(path[-1]) } };"
+    "for (op in sets) {"
+    " def obj = ctx._source; def path = op[0];"
+    " for (int i = 0; i < path.size() - 1; i++) {"
+    " if (!(obj[path[i]] instanceof Map)) { obj[path[i]] = [:] };"
+    " obj = obj[path[i]] };"
+    " obj[path[-1]] = op[1] }"
+)
+
+UPDATE_SCRIPT_LANG = 'groovy'
+
+
+def diff_source(old, new, removed=()):
+    """Compute the changes between two sources
+
+    Returns the list of [path, value] pairs to set and the list of paths to
+    remove. A path is the list of keys leading to the value. Nested dicts
+    are compared key by key, all other values are replaced as a whole.
+
+    `removed` contains top level keys which were removed from `old`.
+    """
+    sets = []
+    removes = [[name] for name in removed if name not in new]
+    _diff(old, new, [], sets, removes)
+    return sets, removes
+
+
+def _diff(old, new, path, sets, removes):
+    for key, value in new.iteritems():
+        if key not in old:
+            sets.append([path + [key], value])
+            continue
+        current = old[key]
+        if current == value:
+            continue
+        if isinstance(current, dict) and isinstance(value, dict):
+            _diff(current, value, path + [key], sets, removes)
+        else:
+            sets.append([path + [key], value])
+    for key in old:
+        if key not in new:
+            removes.append(path + [key])
+
+
+def update_params(sets, removes):
+    """Build the params of the update script
+    """
+    return {'sets': sets, 'removes': removes}
+
+
+def apply_update(source, params):
+    """Apply the changes of the update script to `source` in place
+
+    This is the python implementation of `UPDATE_SCRIPT`.
+    """
+    for path in params['removes']:
+        obj = source
+        for key in path[:-1]:
+            if not isinstance(obj, dict):
+                break
+            obj = obj.get(key)
+        if isinstance(obj, dict):
+            obj.pop(path[-1], None)
+    for path, value in params['sets']:
+        obj = source
+        for key in path[:-1]:
+            if not isinstance(obj.get(key), dict):
+                obj[key] = {}
+            obj = obj[key]
+        obj[path[-1]] = value
+    return source
@@ -0,0 +1,119 @@
+import multiprocessing
+import time
+from collections import deque
+
+from .bulk import Bulk
+
+
+def build_actions(doc_class, records):
+    """Build the serialized bulk index actions for raw records
+
+    A record is a dict with the property values of a document.
+    """
+    codec = doc_class._codec()
+    actions = []
+    for record in records:
+        doc = doc_class(**record)
+        source = doc._get_store_index_body()
+        actions.append({
+            '_op_type': 'index',
+            '_index': doc.INDEX,
+            '_type': doc.DOC_TYPE,
+            '_id': doc.get_primary_key(),
+            '_source': codec.dumps(source),
+        })
+    return actions
+
+
+def _build_actions(args):
+    # the entry point in the worker processes
+    return build_actions(*args)
+
+
+def chunked(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class IngestPipeline(object):
+    """Index raw records with the store bodies built in a process pool
+
+    The records are split into chunks of `chunk_size` records. The worker
+    processes create the documents and serialize their store bodies, the
+    main process sends the serialized actions as bulk requests.
+
+    At most `max_in_flight` chunks are submitted to the pool and not yet
+    sent, this bounds the memory used for large ingests.
+
+    `processes` is the number of worker processes, the default is the
+    number of CPUs. With 0 processes the bodies are built in the calling
+    process.
+
+    The document class must be importable in the worker processes.
+    `bulk_args` are passed to the bulk requests.
+    """
+
+    def __init__(self,
+                 doc_class,
+                 es=None,
+                 processes=None,
+                 chunk_size=500,
+                 max_in_flight=None,
+                 **bulk_args):
+        self.doc_class = doc_class
+        self.es = es or doc_class._get_es()
+        if processes is None:
+            processes = multiprocessing.cpu_count()
+        self.processes = processes
+        self.chunk_size = chunk_size
+        self.max_in_flight = max_in_flight or max(2, 2 * processes)
+        self.bulk_args = bulk_args
+
+    def run(self, records):
+        """Index the records
+
+        Returns the statistics of the ingest.
+        """
+        stats = {'documents': 0, 'requests': 0, 'errors': 0}
+        started = time.time()
+        chunks = chunked(records, self.chunk_size)
+        if not self.processes:
+            for chunk in chunks:
+                self._send(build_actions(self.doc_class, chunk), stats)
+        else:
+            pool = multiprocessing.Pool(self.processes)
+            try:
+                pending = deque()
+                for chunk in chunks:
+                    pending.append(pool.apply_async(
+                                        _build_actions,
+                                        ((self.doc_class, chunk),)))
+                    if len(pending) >= self.max_in_flight:
+                        self._send(pending.popleft().get(), stats)
+                while pending:
+                    self._send(pending.popleft().get(), stats)
+            finally:
+                pool.terminate()
+                pool.join()
+        stats['seconds'] = time.time() - started
+        stats['docs_per_sec'] = (stats['seconds']
+                                 and stats['documents'] / stats['seconds'])
+        return stats
+
+    def _send(self, actions, stats):
+        bulk = Bulk(self.es, **self.bulk_args)
+        bulk.actions.extend(actions)
+        bulk.doc_classes.add(self.doc_class)
+        success, errors = bulk.flush()
+        if not isinstance(errors, int):
+            # the errors are only counted with `stats_only`
+            errors = len(errors)
+        stats['documents'] += success
+        stats['requests'] += 1
+        stats['errors'] += errors
@@ -1,3 +1,4 @@
+from ..diagnostics.nplusone import record_load
 from .document import Document
 
 
@@ -22,6 +23,19 @@ class LazyDocument(object):
         object.__setattr__(self, "_doc_primary_key", primary_key)
         object.__setattr__(self, "_doc_properties", properties)
         object.__setattr__(self, "_doc_ref", document)
+        if document is not None:
+            object.__getattribute__(self, "_doc_resolved")()
+
+    def _doc_resolved(self):
+        """Switch to the fast path for a loaded document
+
+        The class of the proxy is replaced by a subclass which directly
+        forwards the attribute access to the loaded document.
+        """
+        cls = object.__getattribute__(self, "__class__")
+        resolved = cls.__dict__.get("_doc_resolved_class")
+        if resolved is not None:
+            object.__setattr__(self, "__class__", resolved)
 
     def _doc_resolver(self):
         """Provides the referenced document
@@ -36,12 +50,15 @@ class LazyDocument(object):
         """Load a document based on the primary key
         """
         pk = object.__getattribute__(self, "_doc_primary_key")
-        doc = object.__getattribute__(self, "_doc_class").get(pk)
+        doc_class = object.__getattribute__(self, "_doc_class")
+        record_load('lazy', doc_class.__name__, doc_class)
+        doc = doc_class.get(pk)
         object.__setattr__(self, "_doc_ref", doc)
         if doc is not None:
             props = object.__getattribute__(self, "_doc_properties")
             for k, v in props.iteritems():
                 setattr(doc, k, v)
+            object.__getattribute__(self, "_doc_resolved")()
         return doc
 
     #
@@ -124,8 +141,15 @@ class LazyDocument(object):
         for name in cls._special_names:
             if hasattr(theclass, name):
                 namespace[name] = make_method(name)
-        return type("%s(%s)" % (cls.__name__, theclass.__name__),
-                    (cls,), namespace)
+        name = "%s(%s)" % (cls.__name__, theclass.__name__)
+        proxy = type(name, (cls,), namespace)
+        proxy._doc_resolved_class = type(name, (proxy,), {
+            '__slots__': (),
+            '__getattribute__': _resolved_getattribute,
+            '__setattr__': _resolved_setattr,
+            '__delattr__': _resolved_delattr,
+        })
+        return proxy
 
     def __new__(cls, doc_cls=None, primary_key=None, *args, **kwargs):
         """
@@ -155,5 +179,21 @@ class LazyDocument(object):
         return ins
 
 
+# provides the document of a resolved proxy
+_doc_ref = LazyDocument.__dict__["_doc_ref"].__get__
+
+
+def _resolved_getattribute(self, name):
+    return getattr(_doc_ref(self), name)
+
+
+def _resolved_setattr(self, name, value):
+    setattr(_doc_ref(self), name, value)
+
+
+def _resolved_delattr(self, name):
+    delattr(_doc_ref(self), name)
+
+
 def remove_proxy(lazyDoc):
     return object.__getattribute__(lazyDoc, "_doc_resolver")()
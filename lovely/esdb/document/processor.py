@@ -0,0 +1,253 @@
+import logging
+import threading
+import time
+from Queue import Queue, Empty
+
+from .bulk import Bulk
+
+
+logger = logging.getLogger(__name__)
+
+# put into the queue to stop a worker
+_STOP = object()
+
+
+class BulkFuture(object):
+    """The result of an operation handed to a `BulkProcessor`
+
+    The future is done when the response for the document was received.
+    """
+
+    def __init__(self, doc):
+        self.doc = doc
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._response = None
+        self._error = None
+        self._callbacks = []
+
+    def done(self):
+        return self._event.is_set()
+
+    def result(self, timeout=None):
+        """Wait for the response item of the operation
+
+        Raises the error of the operation if it failed.
+        """
+        if not self._event.wait(timeout):
+            raise RuntimeError('BulkFuture timed out')
+        if self._error is not None:
+            raise self._error
+        return self._response
+
+    def exception(self, timeout=None):
+        """Wait for the operation and provide its error or None
+        """
+        if not self._event.wait(timeout):
+            raise RuntimeError('BulkFuture timed out')
+        return self._error
+
+    def add_done_callback(self, fn):
+        """Call `fn` with the future when it is done
+
+        If the future is already done `fn` is called immediately.
+        """
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(fn)
+                return
+        fn(self)
+
+    def _set(self, doc, response, error):
+        """Complete the future, used as callback of the bulk action
+        """
+        with self._lock:
+            if self._event.is_set():
+                return
+            self._response = response
+            self._error = error
+            self._event.set()
+            callbacks = self._callbacks
+            self._callbacks = []
+        for fn in callbacks:
+            try:
+                fn(self)
+            except Exception:
+                logger.exception('BulkFuture callback failed')
+
+
+class BulkProcessor(object):
+    """A thread safe processor sending bulk requests in the background
+
+    Threads hand operations to the processor and continue without waiting
+    for the request. The bulk actions are built in the calling thread, the
+    requests are sent by `workers` background threads.
+
+    The operations are queued in a queue with `queue_size` entries. If the
+    queue is full the calling thread blocks until there is space again.
+
+    A worker sends a bulk request if it has collected `batch_size`
+    operations or `flush_interval` seconds after it took the first
+    operation of the batch.
+
+    All operations return a `BulkFuture`. The optional `callback` of an
+    operation is called in the worker thread with the future when the
+    operation is done.
+
+    `bulk_args` are passed to the bulk implementation of the elasticsearch
+    client, the errors of single actions are always reported through the
+    futures.
+    """
+
+    def __init__(self,
+                 es,
+                 workers=2,
+                 batch_size=500,
+                 queue_size=10000,
+                 flush_interval=1.0,
+                 **bulk_args):
+        self.es = es
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.bulk_args = bulk_args
+        self.bulk_args['raise_on_error'] = False
+        self.queue = Queue(queue_size)
+        self.closed = False
+        self._lock = threading.Lock()
+        self.stats = {'operations': 0,
+                      'requests': 0,
+                      'succeeded': 0,
+                      'failed': 0}
+        self.workers = []
+        for i in range(workers):
+            worker = threading.Thread(target=self._work,
+                                      name='BulkProcessor-%s' % i)
+            worker.daemon = True
+            worker.start()
+            self.workers.append(worker)
+
+    def store(self, doc, if_version=None, callback=None):
+        """Store a document
+
+        See `Bulk.store`.
+        """
+        return self._add(doc, callback, Bulk.store, doc, if_version)
+
+    def delete(self, doc, if_version=None, callback=None):
+        """Delete a document
+
+        See `Bulk.delete`.
+        """
+        return self._add(doc, callback, Bulk.delete, doc, if_version)
+
+    def update_or_create(self, doc, properties=None, callback=None):
+        """Update or create a document
+
+        See `Bulk.update_or_create`.
+        """
+        return self._add(doc, callback, Bulk.update_or_create, doc,
+                         properties)
+
+    def flush(self):
+        """Wait until all queued operations are sent
+        """
+        self.queue.join()
+
+    def close(self):
+        """Send all queued operations and stop the workers
+
+        No operations are accepted after closing.
+        """
+        with self._lock:
+            if self.closed:
+                return
+            self.closed = True
+        self.queue.join()
+        for worker in self.workers:
+            self.queue.put(_STOP)
+        for worker in self.workers:
+            worker.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _add(self, doc, callback, operation, *args):
+        """Build the bulk action for an operation and queue it
+        """
+        if self.closed:
+            raise RuntimeError('BulkProcessor is closed')
+        future = BulkFuture(doc)
+        if callback is not None:
+            future.add_done_callback(callback)
+        bulk = Bulk(self.es)
+        operation(bulk, *args, callback=future._set)
+        with self._lock:
+            self.stats['operations'] += 1
+        if not bulk.actions:
+            # nothing to send
+            future._set(doc, None, None)
+            return future
+        # blocks if the queue is full
+        self.queue.put((bulk, future))
+        return future
+
+    def _work(self):
+        stop = False
+        while not stop:
+            batch, stop = self._next_batch()
+            if batch:
+                self._send(batch)
+            for i in range(len(batch) + stop):
+                self.queue.task_done()
+
+    def _next_batch(self):
+        """Collect the operations for the next bulk request
+
+        Returns the operations and whether the worker has to stop.
+        """
+        batch = []
+        item = self.queue.get()
+        if item is _STOP:
+            return batch, True
+        batch.append(item)
+        deadline = time.time() + self.flush_interval
+        while len(batch) < self.batch_size:
+            timeout = deadline - time.time()
+            if timeout <= 0:
+                break
+            try:
+                item = self.queue.get(timeout=timeout)
+            except Empty:
+                break
+            if item is _STOP:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _send(self, batch):
+        bulk = Bulk(self.es, **self.bulk_args)
+        for operation, future in batch:
+            bulk.extend(operation)
+        try:
+            bulk.flush()
+        except Exception as e:
+            logger.exception('BulkProcessor request failed')
+            for operation, future in batch:
+                future._set(future.doc, None, e)
+        succeeded = failed = 0
+        for operation, future in batch:
+            if not future.done():
+                # no response item for the action
+                future._set(future.doc, None,
+                            RuntimeError('No response for the document'))
+            if future._error is None:
+                succeeded += 1
+            else:
+                failed += 1
+        with self._lock:
+            self.stats['requests'] += 1
+            self.stats['succeeded'] += succeeded
+            self.stats['failed'] += failed
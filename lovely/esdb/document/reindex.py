@@ -0,0 +1,263 @@
+import json
+import os
+import re
+import threading
+import time
+from multiprocessing.pool import ThreadPool
+
+import elasticsearch.exceptions
+
+from ..diagnostics.instrumentation import INSTRUMENTATION
+from .bulk import Bulk
+from .scan import slice_query
+
+
+class Reindex(object):
+    """Copy the documents of a class into a new index and switch the alias
+
+    `INDEX` of the document class is the alias of the versioned indexes
+    `<alias>_v<n>`. The documents are copied from the alias into the next
+    version, the index is created with the current mapping of the class.
+    When all documents are copied the alias is moved to the new index in
+    one atomic request. The old indexes are kept.
+
+    If `INDEX` is still a concrete index it is only reindexed with
+    `migrate`. The documents are copied into `<index>_v1` and the switch
+    replaces the concrete index by the alias, the concrete index is
+    deleted in the same request.
+
+    With `hydrate` the hits are converted to documents and indexed with
+    the source of the current class, missing properties get their defaults.
+    `transform` is called with the document or, without `hydrate`, with the
+    raw source and returns the document or source to index. Hits are
+    skipped if it returns None.
+
+    The hits are read by `slices` sliced scrolls in parallel threads and
+    written with bulk requests of `size` documents. The documents keep
+    their versions, documents changed while the reindex runs are updated
+    by running the reindex again into the same index.
+
+    With a `checkpoint` file the completed slices are stored, a
+    reindex started with the same checkpoint file only copies the
+    remaining slices. A slice is the unit of the checkpoint, a slice which
+    didn't complete is copied again. Large indexes should use enough
+    slices to keep the work lost by a failure small. Sliced scrolls need
+    elasticsearch 5.0 or later, older clusters must use one slice.
+
+    `progress` is called with the statistics after every bulk request.
+    `bulk_args` are passed to the bulk requests.
+    """
+
+    def __init__(self,
+                 doc_class,
+                 target=None,
+                 hydrate=False,
+                 transform=None,
+                 slices=4,
+                 size=500,
+                 scroll='5m',
+                 checkpoint=None,
+                 settings=None,
+                 progress=None,
+                 migrate=False,
+                 **bulk_args):
+        self.doc_class = doc_class
+        self.es = doc_class._get_es()
+        self.alias = doc_class.INDEX
+        self.hydrate = hydrate
+        self.transform = transform
+        self.size = size
+        self.scroll = scroll
+        self.checkpoint = checkpoint
+        self.settings = settings
+        self.progress = progress
+        self.migrate = migrate
+        self.bulk_args = bulk_args
+        self.done = {}
+        state = self._load_checkpoint()
+        if state is not None:
+            target = state['target']
+            slices = state['slices']
+            self.done = dict((int(k), v) for k, v in state['done'].items())
+        self.target = target or self.next_index()
+        self.slices = slices
+        self.stats = {'total': 0,
+                      'documents': 0,
+                      'skipped': 0,
+                      'errors': 0}
+        self._lock = threading.Lock()
+
+    def indexes(self):
+        """Provide the names of the indexes the alias points to
+        """
+        try:
+            res = self.es.indices.get_alias(name=self.alias)
+        except elasticsearch.exceptions.NotFoundError:
+            return []
+        return sorted(res)
+
+    def is_concrete(self):
+        """Check if `INDEX` of the class is a concrete index
+        """
+        return (self.es.indices.exists(index=self.alias)
+                and not self.indexes())
+
+    def next_index(self):
+        """Provide the name of the next version of the index
+        """
+        pattern = re.compile(r'^%s_v(\d+)$' % re.escape(self.alias))
+        versions = [int(m.group(1)) for m in
+                    [pattern.match(name) for name in self.indexes()] if m]
+        return '%s_v%s' % (self.alias, max(versions or [0]) + 1)
+
+    def run(self, switch=True):
+        """Copy the documents and switch the alias
+
+        Returns the statistics of the reindex.
+        """
+        if self.is_concrete() and not self.migrate:
+            raise ValueError('Index "%s" is not an alias' % self.alias)
+        self._create_target()
+        self._save_checkpoint()
+        self.stats['total'] = self.doc_class.count()
+        self.stats['documents'] = sum(self.done.values())
+        self._started = time.time()
+        self._start_documents = self.stats['documents']
+        todo = [i for i in range(self.slices) if i not in self.done]
+        if len(todo) <= 1:
+            for slice_id in todo:
+                self._copy_slice(slice_id)
+        else:
+            pool = ThreadPool(len(todo))
+            try:
+                results = [pool.apply_async(self._copy_slice, (slice_id,))
+                           for slice_id in todo]
+                # all slices are finished before an error is raised to
+                # checkpoint the completed slices
+                for result in results:
+                    result.wait()
+                for result in results:
+                    result.get()
+            finally:
+                pool.terminate()
+                pool.join()
+        self._update_stats()
+        if switch:
+            self.switch()
+        return self.stats
+
+    def switch(self):
+        """Move the alias to the target index in one request
+        """
+        self.es.indices.refresh(index=self.target)
+        actions = [{'remove': {'index': index, 'alias': self.alias}}
+                   for index in self.indexes() if index != self.target]
+        if self.is_concrete():
+            # the alias replaces the concrete index
+            actions.append({'remove_index': {'index': self.alias}})
+        actions.append({'add': {'index': self.target, 'alias': self.alias}})
+        return INSTRUMENTATION.request('update_aliases',
+                                       self.doc_class,
+                                       self.alias,
+                                       None,
+                                       self.es.indices.update_aliases,
+                                       body={'actions': actions})
+
+    def _create_target(self):
+        if self.es.indices.exists(index=self.target):
+            return
+        body = {'mappings': {self.doc_class.DOC_TYPE:
+                             self.doc_class.get_mapping()}}
+        if self.settings is not None:
+            body['settings'] = self.settings
+        INSTRUMENTATION.request('create_index',
+                                self.doc_class,
+                                self.target,
+                                body,
+                                self.es.indices.create,
+                                index=self.target,
+                                body=body)
+
+    def _copy_slice(self, slice_id):
+        query = {'version': True}
+        if self.slices > 1:
+            query = slice_query(query, slice_id, self.slices)
+        copied = 0
+        for hits in self.doc_class._scan_pages(query, self.size, self.scroll):
+            bulk = Bulk(self.es, **self.bulk_args)
+            bulk.doc_classes.add(self.doc_class)
+            skipped = 0
+            for hit in hits:
+                source = self._source(hit)
+                if source is None:
+                    skipped += 1
+                    continue
+                action = {'_op_type': 'index',
+                          '_index': self.target,
+                          '_type': self.doc_class.DOC_TYPE,
+                          '_id': hit['_id'],
+                          '_source': source}
+                if hit.get('_version'):
+                    action['_version'] = hit['_version']
+                    action['_version_type'] = 'external_gte'
+                bulk.actions.append(action)
+            success, errors = 0, 0
+            if bulk.actions:
+                success, errors = bulk.flush()
+                if not isinstance(errors, int):
+                    # the errors are only counted with `stats_only`
+                    errors = len(errors)
+            copied += success
+            with self._lock:
+                self.stats['documents'] += success
+                self.stats['skipped'] += skipped
+                self.stats['errors'] += errors
+                self._update_stats()
+                if self.progress is not None:
+                    self.progress(dict(self.stats))
+        with self._lock:
+            self.done[slice_id] = copied
+            self._save_checkpoint()
+
+    def _source(self, hit):
+        if not self.hydrate:
+            source = hit['_source']
+            if self.transform is not None:
+                source = self.transform(source)
+            return source
+        doc = self.doc_class.from_raw_es_data(hit)
+        if self.transform is not None:
+            doc = self.transform(doc)
+            if doc is None:
+                return None
+        return doc._get_store_index_body()
+
+    def _update_stats(self):
+        stats = self.stats
+        stats['seconds'] = time.time() - self._started
+        copied = stats['documents'] - self._start_documents
+        stats['docs_per_sec'] = stats['seconds'] and copied / stats['seconds']
+        remaining = stats['total'] - stats['documents'] - stats['skipped']
+        if remaining <= 0:
+            stats['eta'] = 0.0
+        elif stats['docs_per_sec']:
+            stats['eta'] = remaining / stats['docs_per_sec']
+        else:
+            stats['eta'] = None
+
+    def _load_checkpoint(self):
+        if self.checkpoint is None or not os.path.exists(self.checkpoint):
+            return None
+        with open(self.checkpoint) as f:
+            return json.load(f)
+
+    def _save_checkpoint(self):
+        if self.checkpoint is None:
+            return
+        state = {'target': self.target,
+                 'slices': self.slices,
+                 'done': self.done}
+        tmp = self.checkpoint + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(state, f)
+        os.rename(tmp, self.checkpoint)
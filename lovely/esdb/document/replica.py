@@ -0,0 +1,221 @@
+import mmap
+import os
+import struct
+import time
+
+
+MAGIC = 'ESDBREP1'
+
+# magic, document count, creation time, offset of the ids, offset of the
+# index
+HEADER = struct.Struct('<8sIdQQ')
+
+# offset and length of the id, offset and length of the source, version
+ENTRY = struct.Struct('<QIQIq')
+
+
+def write_replica(doc_class, path, query=None, **scan_args):
+    """Write the documents of a class to a replica file
+
+    The file contains the serialized sources of the documents and an index
+    of the ids sorted by id. The sources are written while the documents
+    are scanned, only the index is kept in memory. The file is replaced
+    atomically, readers of the old file are not affected.
+
+    `scan_args` are passed to the scan. Returns the statistics of the
+    replica.
+    """
+    codec = doc_class._codec()
+    started = time.time()
+    body = dict(query or {})
+    body.setdefault('version', True)
+    entries = []
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, 0, 0, 0, 0))
+        offset = HEADER.size
+        for hits in doc_class._scan_pages(body, **scan_args):
+            blobs = []
+            for hit in hits:
+                blob = codec.dumps(hit['_source'])
+                if isinstance(blob, unicode):
+                    blob = blob.encode('utf-8')
+                entries.append((hit['_id'].encode('utf-8'),
+                                offset,
+                                len(blob),
+                                hit.get('_version') or 0))
+                offset += len(blob)
+                blobs.append(blob)
+            f.write(''.join(blobs))
+        entries.sort()
+        ids_offset = offset
+        index = []
+        for id, blob_offset, blob_len, version in entries:
+            index.append(ENTRY.pack(offset, len(id), blob_offset, blob_len,
+                                    version))
+            offset += len(id)
+        f.write(''.join([entry[0] for entry in entries]))
+        f.write(''.join(index))
+        f.seek(0)
+        f.write(HEADER.pack(MAGIC, len(entries), started, ids_offset, offset))
+    os.rename(tmp, path)
+    return {'documents': len(entries),
+            'bytes': os.path.getsize(path),
+            'seconds': time.time() - started}
+
+
+class ReplicaFile(object):
+    """Read only access to a memory mapped replica file
+
+    The file is shared between processes through the page cache.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self.stat = os.fstat(f.fileno())
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.count, self.created, self._ids, self._index = \
+            HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC:
+            self._mmap.close()
+            raise ValueError('"%s" is not a replica file' % path)
+
+    def __len__(self):
+        return self.count
+
+    def _entry(self, i):
+        return ENTRY.unpack_from(self._mmap, self._index + i * ENTRY.size)
+
+    def _id(self, entry):
+        return self._mmap[entry[0]:entry[0] + entry[1]]
+
+    def lookup(self, id):
+        """Provide the version and the serialized source of a document
+
+        Returns None if the id is not in the replica.
+        """
+        if isinstance(id, unicode):
+            id = id.encode('utf-8')
+        else:
+            id = str(id)
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            entry = self._entry(mid)
+            current = self._id(entry)
+            if current < id:
+                lo = mid + 1
+            elif current > id:
+                hi = mid
+            else:
+                return entry[4], self._mmap[entry[2]:entry[2] + entry[3]]
+        return None
+
+    def ids(self):
+        """Provide the sorted ids of the replica
+        """
+        for i in xrange(self.count):
+            yield self._id(self._entry(i)).decode('utf-8')
+
+    def close(self):
+        self._mmap.close()
+
+
+class LocalReplica(object):
+    """Get documents from a local replica file
+
+    `get` and `mget` serve the documents from the replica file written by
+    `write_replica`, the documents are hydrated on every lookup. Documents
+    missing in the replica are requested from elasticsearch. If the replica
+    is older than `max_age` seconds or the file doesn't exist all lookups go
+    to elasticsearch.
+
+    `refresh` opens the file again if it was replaced.
+    """
+
+    def __init__(self, doc_class, path, max_age=None):
+        self.doc_class = doc_class
+        self.path = path
+        self.max_age = max_age
+        self.codec = doc_class._codec()
+        self.stats = {'hits': 0, 'misses': 0, 'expired': 0}
+        self.file = None
+        self.refresh()
+
+    def refresh(self):
+        """Open the replica file if it was replaced
+
+        Returns True if the file was opened.
+        """
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return False
+        if self.file is not None:
+            if (stat.st_ino, stat.st_mtime) == (self.file.stat.st_ino,
+                                                self.file.stat.st_mtime):
+                return False
+            self.file.close()
+        self.file = ReplicaFile(self.path)
+        return True
+
+    def expired(self):
+        if self.file is None:
+            return True
+        return (self.max_age is not None
+                and time.time() - self.file.created > self.max_age)
+
+    def get(self, id):
+        """Get a document
+
+        Returns None if the document doesn't exist.
+        """
+        if self.expired():
+            self.stats['expired'] += 1
+            return self.doc_class.get(id)
+        found = self.file.lookup(id)
+        if found is None:
+            self.stats['misses'] += 1
+            return self.doc_class.get(id)
+        self.stats['hits'] += 1
+        return self._hydrate(id, found)
+
+    def mget(self, ids):
+        """Get multiple documents
+
+        The documents missing in the replica are requested with one mget
+        request.
+        """
+        if self.expired():
+            self.stats['expired'] += len(ids)
+            return self.doc_class.mget(ids)
+        result = []
+        missing = []
+        for i, id in enumerate(ids):
+            found = self.file.lookup(id)
+            if found is None:
+                missing.append(i)
+                result.append(None)
+                continue
+            result.append(self._hydrate(id, found))
+        self.stats['hits'] += len(ids) - len(missing)
+        self.stats['misses'] += len(missing)
+        if missing:
+            docs = self.doc_class.mget([ids[i] for i in missing])
+            for i, doc in zip(missing, docs):
+                result[i] = doc
+        return result
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def _hydrate(self, id, found):
+        version, blob = found
+        return self.doc_class.from_raw_es_data({
+            '_id': unicode(id),
+            '_version': version or None,
+            '_source': self.codec.loads(blob),
+        })
@@ -0,0 +1,94 @@
+import threading
+from Queue import Queue, Full
+
+
+# put into the queue by a worker after the last page of its slice
+_DONE = object()
+
+
+def slice_query(query, slice_id, slices):
+    """Add the slice of a sliced scroll to a query
+    """
+    query = dict(query or {})
+    query['slice'] = {'id': slice_id, 'max': slices}
+    return query
+
+
+def sliced_pages(pages, slices, ordered=False, prefetch=2):
+    """Merge the pages of the slices of a sliced scroll
+
+    `pages` is called with a slice id and provides the iterator over the
+    pages of the slice. Every slice is read by its own thread, with gevent
+    monkey patching the threads are greenlets.
+
+    The pages are provided in the order they arrive. With `ordered` all
+    pages of the first slice are provided before the pages of the next
+    slice.
+
+    At most `prefetch` pages per slice are read ahead, a slice waits until
+    the consumer took its pages. An error reading a slice is raised in the
+    consumer. If the consumer stops early the scrolls are stopped.
+    """
+    stop = threading.Event()
+    if ordered:
+        queues = [Queue(prefetch) for i in range(slices)]
+    else:
+        queues = [Queue(prefetch * slices)] * slices
+
+    def put(queue, item):
+        while not stop.is_set():
+            try:
+                queue.put(item, timeout=0.1)
+                return True
+            except Full:
+                pass
+        return False
+
+    def work(slice_id):
+        queue = queues[slice_id]
+        iterator = pages(slice_id)
+        try:
+            for page in iterator:
+                if not put(queue, (page, None)):
+                    return
+            put(queue, (_DONE, None))
+        except Exception as e:
+            put(queue, (None, e))
+        finally:
+            close = getattr(iterator, 'close', None)
+            if close is not None:
+                close()
+
+    workers = []
+    for slice_id in range(slices):
+        worker = threading.Thread(target=work,
+                                  args=(slice_id,),
+                                  name='scan-slice-%s' % slice_id)
+        worker.daemon = True
+        worker.start()
+        workers.append(worker)
+    try:
+        if ordered:
+            for queue in queues:
+                for page in _drain(queue, 1):
+                    yield page
+        else:
+            for page in _drain(queues[0], slices):
+                yield page
+    finally:
+        stop.set()
+        for worker in workers:
+            worker.join()
+
+
+def _drain(queue, slices):
+    """Provide the pages of a queue until all its slices are done
+    """
+    while slices:
+        page, error = queue.get()
+        if error is not None:
+            raise error
+        if page is _DONE:
+            slices -= 1
+            continue
+        yield page
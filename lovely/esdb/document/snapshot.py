@@ -0,0 +1,142 @@
+import gzip
+import io
+import itertools
+import os
+import time
+from collections import deque
+from multiprocessing.pool import ThreadPool
+
+from .bulk import Bulk
+from .ingest import chunked
+
+
+def export_snapshot(doc_class,
+                    path,
+                    query=None,
+                    size=500,
+                    scroll='5m',
+                    slices=1,
+                    compresslevel=6):
+    """Write the hits of a query to a gzip compressed NDJSON file
+
+    Every line is a JSON object with the `_id`, `_version` and `_source` of
+    a hit, the `db_class__` of inherited documents is part of the source.
+    The hits are fetched with a scroll in pages of `size` hits and written
+    page by page. With more than one slice the pages are read by parallel
+    sliced scrolls.
+
+    Returns the statistics of the export.
+    """
+    codec = doc_class._codec()
+    stats = {'documents': 0, 'bytes': 0}
+    started = time.time()
+    body = dict(query or {})
+    body.setdefault('version', True)
+    f = gzip.open(path, 'wb', compresslevel)
+    try:
+        for hits in doc_class._scan_pages(body, size, scroll, slices):
+            data = ''.join([codec.dumps({'_id': hit['_id'],
+                                         '_version': hit.get('_version'),
+                                         '_source': hit['_source']}) + '\n'
+                            for hit in hits])
+            if isinstance(data, unicode):
+                data = data.encode('utf-8')
+            f.write(data)
+            stats['documents'] += len(hits)
+            stats['bytes'] += len(data)
+    finally:
+        f.close()
+    stats['compressed_bytes'] = os.path.getsize(path)
+    return _finish(stats, started)
+
+
+def import_snapshot(doc_class,
+                    path,
+                    es=None,
+                    offset=0,
+                    chunk_size=500,
+                    threads=1,
+                    preserve_versions=True,
+                    checkpoint=None,
+                    **bulk_args):
+    """Index the documents of a snapshot file written by `export_snapshot`
+
+    The lines are sent in bulk requests of `chunk_size` documents by
+    `threads` threads. At most two requests per thread are pending, the
+    file is read as the requests complete.
+
+    The first `offset` lines of the file are skipped. `checkpoint` is
+    called with the offset of the first line not yet imported after every
+    completed request, the import can be resumed from this offset.
+
+    With `preserve_versions` the documents keep the version of the
+    snapshot. Importing a line twice doesn't fail. Documents with a higher
+    version in elasticsearch are kept, the version conflicts raise a
+    `BulkIndexError` unless `raise_on_error=False` is passed, then they are
+    counted in the errors of the statistics.
+
+    Returns the statistics of the import.
+    """
+    es = es or doc_class._get_es()
+    codec = doc_class._codec()
+    stats = {'documents': 0, 'requests': 0, 'errors': 0, 'offset': offset}
+    started = time.time()
+
+    def send(lines):
+        bulk = Bulk(es, **bulk_args)
+        bulk.doc_classes.add(doc_class)
+        for line in lines:
+            record = codec.loads(line)
+            action = {'_op_type': 'index',
+                      '_index': doc_class.INDEX,
+                      '_type': doc_class.DOC_TYPE,
+                      '_id': record['_id'],
+                      '_source': record['_source']}
+            if preserve_versions and record.get('_version'):
+                action['_version'] = record['_version']
+                action['_version_type'] = 'external_gte'
+            bulk.actions.append(action)
+        return len(lines), bulk.flush()
+
+    def done(result):
+        count, (success, errors) = result
+        if not isinstance(errors, int):
+            # the errors are only counted with `stats_only`
+            errors = len(errors)
+        stats['documents'] += success
+        stats['requests'] += 1
+        stats['errors'] += errors
+        stats['offset'] += count
+        if checkpoint is not None:
+            checkpoint(stats['offset'])
+
+    f = io.BufferedReader(gzip.open(path, 'rb'))
+    try:
+        chunks = chunked(itertools.islice(f, offset, None), chunk_size)
+        if threads <= 1:
+            for chunk in chunks:
+                done(send(chunk))
+        else:
+            pool = ThreadPool(threads)
+            try:
+                # completed in order to provide a valid resume offset
+                pending = deque()
+                for chunk in chunks:
+                    pending.append(pool.apply_async(send, (chunk,)))
+                    if len(pending) >= 2 * threads:
+                        done(pending.popleft().get())
+                while pending:
+                    done(pending.popleft().get())
+            finally:
+                pool.terminate()
+                pool.join()
+    finally:
+        f.close()
+    return _finish(stats, started)
+
+
+def _finish(stats, started):
+    stats['seconds'] = time.time() - started
+    stats['docs_per_sec'] = (stats['seconds']
+                             and stats['documents'] / stats['seconds'])
+    return stats
@@ -0,0 +1,169 @@
+import logging
+import threading
+
+from ..properties import Property
+
+
+logger = logging.getLogger(__name__)
+
+
+class DocumentSync(object):
+    """A local copy of all documents of a class kept up to date by polling
+
+    `load` reads all documents with a scan, `poll` reads the documents
+    changed since the last load or poll. Changes are detected with the
+    property `changed`, it must be a timestamp or sequence number which
+    increases with every write of a document. A poll reads the documents
+    with a value greater or equal to the largest value seen, documents with
+    an unchanged version are skipped.
+
+    `on_change` is called with the new and the previous document for every
+    added or changed document, the previous document is None for new
+    documents. Deleted documents are only detected if `is_deleted` is set,
+    it is called with a document and must return True for soft deleted
+    documents. These documents are removed and `on_delete` is called with
+    the removed document. Documents deleted in elasticsearch are removed by
+    the next `load`.
+
+    Lookups are served from the local dict of documents by id.
+    """
+
+    def __init__(self,
+                 doc_class,
+                 changed,
+                 query=None,
+                 on_change=None,
+                 on_delete=None,
+                 is_deleted=None,
+                 size=500):
+        properties = dict(doc_class._members('_properties__', Property))
+        if changed not in properties:
+            raise ValueError('Unknown property "%s"' % changed)
+        self.doc_class = doc_class
+        self.property = properties[changed]
+        self.query = query
+        self.on_change = on_change
+        self.on_delete = on_delete
+        self.is_deleted = is_deleted
+        self.size = size
+        self.documents = {}
+        self.checkpoint = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def get(self, id, default=None):
+        return self.documents.get(unicode(id), default)
+
+    def mget(self, ids):
+        return [self.documents.get(unicode(id)) for id in ids]
+
+    def __getitem__(self, id):
+        return self.documents[unicode(id)]
+
+    def __contains__(self, id):
+        return unicode(id) in self.documents
+
+    def __len__(self):
+        return len(self.documents)
+
+    def load(self):
+        """Read all documents
+
+        Returns the number of added, changed and removed documents.
+        """
+        with self._lock:
+            seen = set()
+            changes = self._apply(self._hits(None), seen)
+            for id in set(self.documents) - seen:
+                self._remove(id)
+                changes += 1
+            return changes
+
+    def poll(self):
+        """Read the documents changed since the last load or poll
+
+        Returns the number of added, changed and removed documents.
+        """
+        with self._lock:
+            if self.checkpoint is None:
+                return self._apply(self._hits(None))
+            query = {'range': {self.property.get_query_name():
+                               {'gte': self.checkpoint}}}
+            return self._apply(self._hits(query))
+
+    def start(self, interval):
+        """Poll every `interval` seconds in a background thread
+
+        The documents are loaded first if they were never loaded.
+        """
+        if self._thread is not None:
+            raise RuntimeError('DocumentSync is already running')
+        if self.checkpoint is None:
+            self.load()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run,
+                                        args=(interval,),
+                                        name='DocumentSync')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """Stop polling
+        """
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+
+    def _run(self, interval):
+        while not self._stop.wait(interval):
+            try:
+                self.poll()
+            except Exception:
+                logger.exception('DocumentSync poll failed')
+
+    def _hits(self, query):
+        filters = [q for q in (self.query, query) if q is not None]
+        body = {'version': True}
+        if filters:
+            body['query'] = {'bool': {'filter': filters}}
+        return self.doc_class.scan(body, resolve_hits=False, size=self.size)
+
+    def _apply(self, hits, seen=None):
+        # the hits are not ordered by the changed property, the checkpoint
+        # is only moved if all hits are applied
+        changes = 0
+        name = self.property.name
+        checkpoint = self.checkpoint
+        for hit in hits:
+            id = hit['_id']
+            if seen is not None:
+                seen.add(id)
+            value = hit['_source'].get(name)
+            if value is not None and (checkpoint is None
+                                      or value > checkpoint):
+                checkpoint = value
+            previous = self.documents.get(id)
+            if (previous is not None
+                    and previous._meta.get('_version') == hit.get('_version')
+                    and hit.get('_version') is not None):
+                continue
+            doc = self.doc_class.from_raw_es_data(hit)
+            if self.is_deleted is not None and self.is_deleted(doc):
+                if previous is not None:
+                    self._remove(id)
+                    changes += 1
+                continue
+            self.documents[id] = doc
+            changes += 1
+            if self.on_change is not None:
+                self.on_change(doc, previous)
+        self.checkpoint = checkpoint
+        return changes
+
+    def _remove(self, id):
+        doc = self.documents.pop(id)
+        if self.on_delete is not None:
+            self.on_delete(doc)
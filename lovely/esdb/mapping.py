@@ -0,0 +1,52 @@
+import copy
+
+
+# the mapping for internal fields with a name ending with `__` such as
+# `db_class__` and `object_json_pickle__`. They are only stored in the
+# source.
+INTERNAL_FIELD_MAPPING = {
+    'type': 'string',
+    'index': 'no',
+    'doc_values': False,
+    'include_in_all': False,
+}
+
+# the mapping of the ids stored by relations
+ID_FIELD_MAPPING = {
+    'type': 'string',
+    'index': 'not_analyzed',
+}
+
+
+def internal_fields_template():
+    """A dynamic template for the internal fields on all levels
+    """
+    return {
+        'internal_fields': {
+            'match': '*__',
+            'mapping': copy.deepcopy(INTERNAL_FIELD_MAPPING),
+        }
+    }
+
+
+def merge(target, mapping):
+    """Merge `mapping` into the `target` mapping
+
+    Dicts are merged recursively, for all other values the value of `mapping`
+    is used.
+    """
+    for key, value in mapping.iteritems():
+        if isinstance(value, dict) and isinstance(target.get(key), dict):
+            merge(target[key], value)
+        else:
+            target[key] = copy.deepcopy(value)
+    return target
+
+
+def path_mapping(path, leaf):
+    """Build the mapping for the field at `path` inside an object field
+    """
+    mapping = copy.deepcopy(leaf)
+    for name in reversed(path):
+        mapping = {'properties': {name: mapping}}
+    return mapping
@@ -5,3 +5,20 @@ from .relation import (
     LocalOne2NRelation,  # noqa
 )
 from .objectproperty import ObjectProperty  # noqa
+from .typed import (  # noqa
+    TypedProperty,
+    IntegerProperty,
+    FloatProperty,
+    DecimalProperty,
+    BooleanProperty,
+    EnumProperty,
+    DatetimeProperty,
+    DateProperty,
+    ListProperty,
+)
+from .decodecache import (  # noqa
+    DecodeCache,
+    enable_decode_cache,
+    disable_decode_cache,
+    get_decode_cache,
+)
@@ -0,0 +1,109 @@
+import copy
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+class DecodeCache(object):
+    """A LRU cache for decoded pickle payloads
+
+    The cache is keyed by the hash of the payload so identical payloads
+    stored in many documents are only decoded once.
+
+    In the 'copy' mode every access provides a deep copy of the cached object
+    so documents never share an instance. In the 'immutable' mode the cached
+    instance itself is provided, it must not be modified.
+    """
+
+    MODES = ('copy', 'immutable')
+
+    def __init__(self, maxsize=1024, mode='copy'):
+        if mode not in self.MODES:
+            raise ValueError('Unknown decode cache mode "%s"' % mode)
+        self.maxsize = maxsize
+        self.mode = mode
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def decode(self, payload, decoder):
+        """Provide the decoded object for `payload`
+
+        `decoder` is called with the payload if it is not in the cache.
+        """
+        key = self.key(payload)
+        with self._lock:
+            try:
+                obj = self._items.pop(key)
+            except KeyError:
+                obj = self
+            else:
+                # reinsert to mark the item as recently used
+                self._items[key] = obj
+                self.hits += 1
+        if obj is self:
+            obj = decoder(payload)
+            with self._lock:
+                self.misses += 1
+                self._items[key] = obj
+                while len(self._items) > self.maxsize:
+                    self._items.popitem(last=False)
+                    self.evictions += 1
+        if self.mode == 'copy':
+            return copy.deepcopy(obj)
+        return obj
+
+    def key(self, payload):
+        if isinstance(payload, unicode):
+            payload = payload.encode('utf-8')
+        return hashlib.sha1(payload).digest()
+
+    @property
+    def hit_rate(self):
+        requests = self.hits + self.misses
+        if not requests:
+            return 0.0
+        return float(self.hits) / requests
+
+    def stats(self):
+        return {
+            'size': len(self._items),
+            'maxsize': self.maxsize,
+            'mode': self.mode,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hit_rate,
+        }
+
+    def clear(self):
+        """Remove all items and reset the statistics
+        """
+        with self._lock:
+            self._items.clear()
+            self.hits = self.misses = self.evictions = 0
+
+
+# the process wide decode cache, disabled if None
+_decode_cache = None
+
+
+def enable_decode_cache(maxsize=1024, mode='copy'):
+    """Enable the process wide decode cache for object properties
+    """
+    global _decode_cache
+    _decode_cache = DecodeCache(maxsize, mode)
+    return _decode_cache
+
+
+def disable_decode_cache():
+    global _decode_cache
+    _decode_cache = None
+
+
+def get_decode_cache():
+    """Provide the process wide decode cache or None if it is disabled
+    """
+    return _decode_cache
@@ -0,0 +1,78 @@
+import re
+from datetime import datetime, date
+
+import dateutil.parser
+from dateutil.tz import tzoffset, tzutc
+
+
+# the formats created by `date.isoformat()` and `datetime.isoformat()`
+ISOFORMAT = re.compile(r"""
+    (\d{4})-(\d\d)-(\d\d)
+    (?:
+        T(\d\d):(\d\d):(\d\d)
+        (?:\.(\d{6}))?
+        (?:([+-])(\d\d):(\d\d))?
+    )?$
+    """, re.VERBOSE)
+
+UTC = tzutc()
+
+# the timezones by offset in seconds
+_timezones = {0: UTC}
+
+
+def get_timezone(offset):
+    """Provide the timezone for an UTC offset in seconds
+    """
+    try:
+        return _timezones[offset]
+    except KeyError:
+        return _timezones.setdefault(offset, tzoffset(None, offset))
+
+
+def parse_isoformat(value):
+    """Parse a string created by `isoformat()`
+
+    Returns None if `value` is not in one of the exact formats created by
+    `date.isoformat()` or `datetime.isoformat()`.
+    """
+    match = ISOFORMAT.match(value)
+    if match is None:
+        return None
+    (year, month, day,
+     hour, minute, second, microsecond,
+     sign, tz_hour, tz_minute) = match.groups()
+    if hour is None:
+        return datetime(int(year), int(month), int(day))
+    tzinfo = None
+    if sign is not None:
+        offset = int(tz_hour) * 3600 + int(tz_minute) * 60
+        if sign == '-':
+            offset = -offset
+        tzinfo = get_timezone(offset)
+    return datetime(int(year), int(month), int(day),
+                    int(hour), int(minute), int(second),
+                    int(microsecond or 0), tzinfo)
+
+
+def parse_datetime(value):
+    """Parse an ISO 8601 string into a datetime
+
+    The formats created by `isoformat()` are parsed directly, all other
+    formats are parsed with dateutil.
+    """
+    try:
+        result = parse_isoformat(value)
+    except ValueError:
+        # out of range values, let dateutil decide
+        result = None
+    if result is None:
+        result = dateutil.parser.parse(value)
+    return result
+
+
+def parse_date(value):
+    """Parse an ISO 8601 string into a date
+    """
+    value = parse_datetime(value)
+    return date(value.year, value.month, value.day)
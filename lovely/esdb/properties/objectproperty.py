@@ -1,13 +1,46 @@
-import json
-import dateutil.parser
+import base64
+import zlib
 from datetime import datetime, date
 import jsonpickle
 from jsonpickle.tags import RESERVED
 
+from ..codec import get_codec
+from ..mapping import INTERNAL_FIELD_MAPPING, merge
 from . import Property
+from .decodecache import get_decode_cache
+from .isoformat import parse_datetime
+
+
+# the format tag of compressed pickle payloads
+ZLIB_TAG = 'zlib:'
 
 
 class ObjectProperty(Property):
+    """A property to store python objects
+
+    The object is stored as a flattened JSON view of the object and a
+    restorable pickle payload.
+
+    If `compress_threshold` is set the pickle payloads with at least
+    `compress_threshold` bytes are stored compressed.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self.compress_threshold = kwargs.pop('compress_threshold', None)
+        super(ObjectProperty, self).__init__(*args, **kwargs)
+
+    def get_mapping(self):
+        """The object mapping with a not indexed pickle payload
+
+        An explicit mapping of the property is merged into the mapping.
+        """
+        mapping = {
+            'type': 'object',
+            'properties': {
+                'object_json_pickle__': INTERNAL_FIELD_MAPPING,
+            },
+        }
+        return merge(merge({}, mapping), self.mapping or {})
 
     def _transform_from_source(self, doc):
         """Provides the original object based on the source
@@ -15,7 +48,7 @@ class ObjectProperty(Property):
         Uses a cached version of the transformed object or creates a new cache
         entry.
         """
-        if self.name not in doc._values.property_cache:
+        if self.name not in doc._values._property_cache:
             try:
                 value = doc._values.get(self.name)
             except KeyError:
@@ -23,8 +56,9 @@ class ObjectProperty(Property):
             if value is None:
                 doc._values.property_cache[self.name] = value
             else:
-                doc._values.property_cache[self.name] = decode(value)
-        return doc._values.property_cache[self.name]
+                doc._values.property_cache[self.name] = decode(
+                                                        value, doc._codec())
+        return doc._values._property_cache[self.name]
 
     def _transform_to_source(self, doc, value):
         """Stores the pickled version of `value` in the source
@@ -34,39 +68,82 @@ class ObjectProperty(Property):
         returns the stored value.
         """
         doc._values.property_cache[self.name] = value
-        return encode(value)
+        return encode(value, doc._codec(), self.compress_threshold)
 
     def _apply(self, doc):
-        if self.name not in doc._values.property_cache:
+        if self.name not in doc._values._property_cache:
             # apply nothing if the property is not in the cache
             return
-        obj = doc._values.property_cache.get(self.name)
-        doc._values.changed[self.name] = obj is None and obj or encode(obj)
+        obj = doc._values._property_cache.get(self.name)
+        doc._values.changed[self.name] = (
+                    obj is None and obj
+                    or encode(obj, doc._codec(), self.compress_threshold))
 
 
-def encode(obj):
+def encode(obj, codec=None, compress_threshold=None):
     """Build a JSON representation of the object
+
+    The JSON is created with `codec`, the default codec is used if no codec
+    is provided.
+
+    If `compress_threshold` is set and the pickle payload has at least
+    `compress_threshold` bytes the payload is compressed.
     """
     if obj is None:
         return None
-    raw = json.loads(jsonpickle.encode(
-                                obj,
-                                unpicklable=False))
-    pickle = jsonpickle.encode(obj)
+    codec = get_codec(codec)
+    raw = codec.loads(jsonpickle.encode(obj,
+                                        unpicklable=False,
+                                        backend=codec))
+    pickle = jsonpickle.encode(obj, backend=codec)
+    if compress_threshold is not None and len(pickle) >= compress_threshold:
+        pickle = compress(pickle)
     raw['object_json_pickle__'] = pickle
     return raw
 
 
-def decode(data):
+def decode(data, codec=None):
     """Recreate a python object from JSON
+
+    Compressed and uncompressed pickle payloads are supported. If the decode
+    cache is enabled identical payloads are only decoded once.
     """
     if data is None:
         return None
     if 'object_json_pickle__' in data:
-        return jsonpickle.decode(data['object_json_pickle__'])
+        backend = get_codec(codec)
+
+        def decoder(payload):
+            return jsonpickle.decode(decompress(payload), backend=backend)
+        cache = get_decode_cache()
+        if cache is None:
+            return decoder(data['object_json_pickle__'])
+        return cache.decode(data['object_json_pickle__'], decoder)
     return data
 
 
+def compress(payload):
+    """Compress a pickle payload
+
+    The compressed payload is tagged with the format to be able to detect
+    it on decoding.
+    """
+    if isinstance(payload, unicode):
+        payload = payload.encode('utf-8')
+    return ZLIB_TAG + base64.b64encode(zlib.compress(payload))
+
+
+def decompress(payload):
+    """Provide the pickle payload of a possibly compressed payload
+
+    Uncompressed payloads are returned unchanged.
+    """
+    if payload.startswith(ZLIB_TAG):
+        return zlib.decompress(
+                    base64.b64decode(payload[len(ZLIB_TAG):])).decode('utf-8')
+    return payload
+
+
 def meta_split(values):
     meta = {}
     data = {}
@@ -97,11 +174,16 @@ class ISODatetimeHandler(jsonpickle.handlers.DatetimeHandler):
         return data
 
     def restore(self, data):
+        """Restores the date or datetime
+
+        The formats created by `flatten` are parsed directly, other formats
+        are parsed with dateutil.
+        """
         cls, payload = data['__reduce__']
         unpickler = self.context
         restore = unpickler.restore
         cls = restore(cls, reset=False)
-        value = dateutil.parser.parse(payload)
+        value = parse_datetime(payload)
         if cls is date:
             # this was a date object
             value = cls(value.year, value.month, value.day)
@@ -1,5 +1,7 @@
 import copy
 
+from ..mapping import merge
+
 
 class Property(object):
     """A property to access data of a document
@@ -13,10 +15,12 @@ class Property(object):
                  name=None,
                  default=None,
                  primary_key=False,
-                 doc=u''
+                 doc=u'',
+                 mapping=None
                 ):
         self.name = name
         self.doc = doc
+        self.mapping = mapping
         if hasattr(default, '__call__'):
             self.default = default
         else:
@@ -85,6 +89,16 @@ class Property(object):
     def get_query_name(self):
         return self.name
 
+    def get_mapping(self):
+        """Provide the elasticsearch mapping of the property
+
+        Returns None if the property has no explicit mapping and the mapping
+        is left to the dynamic mapping of elasticsearch.
+        """
+        if self.mapping is None:
+            return None
+        return merge({}, self.mapping)
+
     def _apply(self, doc):
         """Called before the document is stored or updated
 
@@ -96,10 +110,10 @@ class Property(object):
         in `source`.
         The default implementation does nothing
         """
-        if (self.name in doc._values.changed
-            and self.name in doc._values.source
-            and (doc._values.changed[self.name]
-                 == doc._values.source[self.name])
+        if (self.name in doc._values._changed
+            and self.name in doc._values._source
+            and (doc._values._changed[self.name]
+                 == doc._values._source[self.name])
            ):
             # an unchanged value is in changed, remove it
             del doc._values.changed[self.name]
@@ -117,10 +131,10 @@ class Property(object):
         it is a dict or list. If somthing is changed inside the dict or list
         it will be detected in the `_apply` method.
         """
-        if (self.name not in doc._values.changed
-            and self.name in doc._values.source
+        if (self.name not in doc._values._changed
+            and self.name in doc._values._source
            ):
-            value = doc._values.source[self.name]
+            value = doc._values._source[self.name]
             if isinstance(value, (list, tuple, dict)):
                 doc._values.changed[self.name] = copy.deepcopy(value)
         return doc._values.get(self.name)
@@ -131,7 +145,7 @@ class Property(object):
         return value
 
     def _set_default(self, doc):
-        if self.name not in doc._values.default:
+        if self.name not in doc._values._default:
             value = self._setter(doc, self.default())
             doc._values.default[self.name] = \
                 self._transform_to_source(doc, value)
@@ -1,10 +1,15 @@
 import copy
 
+from ..diagnostics.nplusone import record_load
+from ..mapping import ID_FIELD_MAPPING, path_mapping
+
 
 class RelationBase(object):
     """Used as a marker for relation classes
     """
 
+    name = None  # the name of the relation in the document class
+
 
 class RelationResolver(object):
     """Resolve relations
@@ -16,16 +21,23 @@ class RelationResolver(object):
     same instance of the related document.
     """
 
+    __slots__ = ('instance', 'relation', 'transformer', '_cache', 'cacheKey')
+
     def __init__(self, instance, relation, transformer, cache=None):
         self.instance = instance
         self.relation = relation
         self.transformer = transformer
-        if cache is None:
-            self.cache = {}
-        else:
-            self.cache = cache
+        self._cache = cache
         self.cacheKey = None
 
+    @property
+    def cache(self):
+        """The cache is only allocated if it is needed
+        """
+        if self._cache is None:
+            self._cache = {}
+        return self._cache
+
     @property
     def id(self):
         data = self.relation.get_local_data(self.instance)
@@ -60,7 +72,12 @@ class RelationResolver(object):
                 doc = None
             else:
                 # get the document from the store
-                doc = self.relation.remote_class.get(remoteId)
+                remote_class = self.relation.remote_class
+                record_load('relation',
+                            '%s.%s' % (self.instance.__class__.__name__,
+                                       self.relation.name),
+                            remote_class)
+                doc = remote_class.get(remoteId)
             self.cache[cacheKey] = {
                 'for': remoteId,
                 'doc': doc
@@ -129,6 +146,18 @@ class LocalRelation(RelationBase):
     def get_query_name(self):
         return '.'.join(self._local_path[1:])
 
+    def get_mapping(self, doc_class):
+        """Provide the mapping for the local relation data
+
+        Returns a tuple with the name of the property containing the data and
+        the mapping for the property.
+        """
+        prop = getattr(doc_class, self._local_path[0])
+        leaf = ID_FIELD_MAPPING
+        if self.relationProperties is not None:
+            leaf = {'properties': {'id': ID_FIELD_MAPPING}}
+        return prop.name, path_mapping(self._local_path[1:], leaf)
+
     def get_local_data(self, doc):
         """Provide the property data stored on the document
         """
@@ -199,14 +228,15 @@ class ListRelationResolver(object):
     """Resolve a list of relations
     """
 
+    __slots__ = ('instance', 'relation', 'transformer', '_cache')
+
     def __init__(self, instance, relation, transformer, cache=None):
         self.instance = instance
         self.relation = relation
         self.transformer = transformer
-        if cache is None:
-            self.cache = {}
-        else:
-            self.cache = cache
+        self._cache = cache
+
+    cache = RelationResolver.cache
 
     @property
     def remote(self):
@@ -256,6 +286,8 @@ class ListItemRelationResolver(RelationResolver):
     """Resolve an item from a list relation
     """
 
+    __slots__ = ('idx',)
+
     def __init__(self, instance, relation, idx, transformer, cache=None):
         super(ListItemRelationResolver, self).__init__(
                                         instance, relation, transformer, cache)
@@ -0,0 +1,262 @@
+from datetime import datetime, date
+from decimal import Decimal, InvalidOperation
+
+from ..mapping import merge
+from . import Property
+from .isoformat import parse_datetime, parse_date
+
+
+class TypedProperty(Property):
+    """Base class for properties with a fixed python type
+
+    An assigned value is converted to the python type with `convert`,
+    checked with the optional `validator` and converted directly into its
+    source representation with `to_source`. `from_source` converts the
+    source back. None is stored as is.
+
+    `validator` is called with the converted value and must raise a
+    ValueError for invalid values.
+
+    `MAPPING` is the elasticsearch mapping of the type, an explicit mapping
+    of the property is merged into it.
+    """
+
+    MAPPING = None
+
+    def __init__(self, *args, **kwargs):
+        self.validator = kwargs.pop('validator', None)
+        super(TypedProperty, self).__init__(*args, **kwargs)
+
+    def get_mapping(self):
+        if self.MAPPING is None and self.mapping is None:
+            return None
+        return merge(merge({}, self.MAPPING or {}), self.mapping or {})
+
+    def convert(self, value):
+        """Convert an assigned value into the python type
+
+        Must raise a ValueError or TypeError if the value can't be converted.
+        """
+        return value
+
+    def validate(self, value):
+        """Convert and validate an assigned value
+        """
+        try:
+            value = self.convert(value)
+        except (ValueError, TypeError):
+            raise ValueError('Invalid value %r for property "%s"'
+                             % (value, self.name))
+        if self.validator is not None:
+            self.validator(value)
+        return value
+
+    def to_source(self, value):
+        """Convert a python value into its source representation
+        """
+        return value
+
+    def from_source(self, value):
+        """Convert a source value into its python representation
+        """
+        return value
+
+    def _transform_from_source(self, doc):
+        value = doc._values.get(self.name)
+        if value is None:
+            return None
+        return self.from_source(value)
+
+    def _transform_to_source(self, doc, value):
+        if value is None:
+            return None
+        return self.to_source(self.validate(value))
+
+
+class IntegerProperty(TypedProperty):
+    """A property for integer values
+    """
+
+    MAPPING = {'type': 'long'}
+
+    def convert(self, value):
+        if isinstance(value, bool):
+            raise TypeError(value)
+        if isinstance(value, float) and not value.is_integer():
+            raise ValueError(value)
+        return int(value)
+
+
+class FloatProperty(TypedProperty):
+    """A property for float values
+    """
+
+    MAPPING = {'type': 'double'}
+
+    def convert(self, value):
+        if isinstance(value, bool):
+            raise TypeError(value)
+        return float(value)
+
+
+class DecimalProperty(TypedProperty):
+    """A property for decimal values
+
+    The decimal is stored as string to keep its precision. Elasticsearch
+    indexes the string as number.
+    """
+
+    MAPPING = {'type': 'double'}
+
+    def convert(self, value):
+        if isinstance(value, (bool, float)):
+            raise TypeError(value)
+        try:
+            return Decimal(value)
+        except InvalidOperation:
+            raise ValueError(value)
+
+    def to_source(self, value):
+        return unicode(value)
+
+    def from_source(self, value):
+        return Decimal(value)
+
+
+class BooleanProperty(TypedProperty):
+    """A property for boolean values
+
+    Only booleans are accepted.
+    """
+
+    MAPPING = {'type': 'boolean'}
+
+    def convert(self, value):
+        if not isinstance(value, bool):
+            raise TypeError(value)
+        return value
+
+
+class EnumProperty(TypedProperty):
+    """A property which only accepts one of the given values
+
+    The values are stored as they are, they must be JSON compatible.
+    """
+
+    MAPPING = {'type': 'string', 'index': 'not_analyzed'}
+
+    def __init__(self, values, *args, **kwargs):
+        self.values = tuple(values)
+        self._allowed = frozenset(self.values)
+        super(EnumProperty, self).__init__(*args, **kwargs)
+
+    def convert(self, value):
+        if value not in self._allowed:
+            raise ValueError(value)
+        return value
+
+
+class DatetimeProperty(TypedProperty):
+    """A property for datetime values
+
+    The datetime is stored in ISO 8601 format. Dates are stored as datetime
+    at midnight, strings are parsed.
+    """
+
+    MAPPING = {'type': 'date'}
+
+    def convert(self, value):
+        if isinstance(value, basestring):
+            return parse_datetime(value)
+        if isinstance(value, datetime):
+            return value
+        if isinstance(value, date):
+            return datetime(value.year, value.month, value.day)
+        raise TypeError(value)
+
+    def to_source(self, value):
+        return value.isoformat()
+
+    def from_source(self, value):
+        return parse_datetime(value)
+
+
+class DateProperty(TypedProperty):
+    """A property for date values
+
+    The date is stored in ISO 8601 format. The time of datetime values is
+    dropped, strings are parsed.
+    """
+
+    MAPPING = {'type': 'date'}
+
+    def convert(self, value):
+        if isinstance(value, basestring):
+            return parse_date(value)
+        if isinstance(value, datetime):
+            return value.date()
+        if isinstance(value, date):
+            return value
+        raise TypeError(value)
+
+    def to_source(self, value):
+        return value.isoformat()
+
+    def from_source(self, value):
+        return parse_date(value)
+
+
+class ListProperty(TypedProperty):
+    """A property for a list of typed values
+
+    The items are converted with the typed property `item`. The python list
+    is kept in the property cache so changes inside the list are stored.
+    """
+
+    def __init__(self, item, *args, **kwargs):
+        self.item = item
+        super(ListProperty, self).__init__(*args, **kwargs)
+
+    def get_mapping(self):
+        # elasticsearch has no list type, the items define the mapping
+        item_mapping = self.item.get_mapping()
+        if item_mapping is None and self.mapping is None:
+            return None
+        return merge(merge({}, item_mapping or {}), self.mapping or {})
+
+    def convert(self, value):
+        if isinstance(value, (basestring, dict)):
+            raise TypeError(value)
+        validate = self.item.validate
+        return [None if v is None else validate(v) for v in value]
+
+    def to_source(self, value):
+        to_source = self.item.to_source
+        return [None if v is None else to_source(v) for v in value]
+
+    def from_source(self, value):
+        from_source = self.item.from_source
+        return [None if v is None else from_source(v) for v in value]
+
+    def _transform_from_source(self, doc):
+        if self.name not in doc._values._property_cache:
+            value = doc._values.get(self.name)
+            if value is not None:
+                value = self.from_source(value)
+            doc._values.property_cache[self.name] = value
+        return doc._values._property_cache[self.name]
+
+    def _transform_to_source(self, doc, value):
+        if value is not None:
+            value = self.validate(value)
+        doc._values.property_cache[self.name] = value
+        return None if value is None else self.to_source(value)
+
+    def _apply(self, doc):
+        if self.name not in doc._values._property_cache:
+            return
+        value = doc._values._property_cache[self.name]
+        if value is not None:
+            value = self.to_source(self.validate(value))
+        doc._values.changed[self.name] = value
+        super(ListProperty, self)._apply(doc)
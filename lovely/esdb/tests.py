@@ -49,6 +49,12 @@ def tearDown(test):
     pass
 
 
+def setUpLocal(test):
+    """Setup for tests which don't need a running cluster
+    """
+    test.globs['pprint'] = pprint
+
+
 def delete_crate_indexes():
     """Deletes the Crate indexes.
     """
@@ -92,10 +98,42 @@ def test_suite():
         create_suite('document/document.rst'),
         create_suite('document/lazy.rst'),
         create_suite('document/bulk.rst'),
+        create_suite('document/mapping.rst', layer=None, setUp=setUpLocal),
+        create_suite('document/incremental.rst', layer=None,
+                     setUp=setUpLocal),
+        create_suite('document/versioning.rst', layer=None,
+                     setUp=setUpLocal),
+        create_suite('document/processor.rst', layer=None,
+                     setUp=setUpLocal),
+        create_suite('document/ingest.rst', layer=None, setUp=setUpLocal),
+        create_suite('document/rows.rst', layer=None, setUp=setUpLocal),
+        create_suite('document/columns.rst', layer=None,
+                     setUp=setUpLocal),
+        create_suite('document/scan.rst', layer=None, setUp=setUpLocal),
+        create_suite('document/snapshot.rst', layer=None,
+                     setUp=setUpLocal),
+        create_suite('document/reindex.rst', layer=None,
+                     setUp=setUpLocal),
+        create_suite('document/byquery.rst', layer=None,
+                     setUp=setUpLocal),
+        create_suite('document/sync.rst', layer=None, setUp=setUpLocal),
+        create_suite('document/replica.rst', layer=None,
+                     setUp=setUpLocal),
+
+        create_suite('codec.rst', layer=None, setUp=setUpLocal),
 
         create_suite('properties/property.rst'),
         create_suite('properties/relation.rst'),
         create_suite('properties/objectproperty.rst'),
+        create_suite('properties/typed.rst', layer=None, setUp=setUpLocal),
+
+        create_suite('diagnostics/instrumentation.rst'),
+        create_suite('diagnostics/nplusone.rst'),
+        create_suite('diagnostics/profiling.rst', layer=None,
+                     setUp=setUpLocal),
+
+        create_suite('benchmark/README.rst', layer=None, setUp=setUpLocal),
+        create_suite('benchmark/fakees.rst', layer=None, setUp=setUpLocal),
 
         # the documentation
         create_suite('../../docs/usage.rst'),
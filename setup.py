@@ -38,5 +38,11 @@ setup(
     ),
     zip_safe=False,
     install_requires=requires,
+    entry_points={
+        'console_scripts': [
+            'esdb-profile = lovely.esdb.diagnostics.profiling:main',
+            'esdb-benchmark = lovely.esdb.benchmark.runner:main',
+        ],
+    },
     test_suite="lovely.esdb",
 )